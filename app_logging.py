@@ -0,0 +1,69 @@
+"""Logging for the app: callers only enqueue records, a listener thread writes them.
+
+The log file is rotated by size. Messages use lazy %-style arguments
+(``log.info("History added: %s", entry)``), and the arguments are only
+rendered on the listener thread. So a log call on the Tk thread costs one
+LogRecord and a queue put, never a file write.
+"""
+import queue
+import logging
+import logging.handlers
+
+from app_settings import LOG_FILE
+
+LOG_FORMAT = "%(asctime)s %(levelname)s:%(message)s"
+
+_listener = None
+_handler = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # QueueHandler.prepare would format the message here, on the caller's
+        # thread; only tracebacks are captured now, while their frames exist
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(settings=None, path=LOG_FILE):
+    """Route the root logger through a queue to a rotating file; safe to call again."""
+    global _listener, _handler
+    settings = settings or {}
+    shutdown_logging()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=int(settings.get("log_max_bytes", 1_000_000)),
+        backupCount=int(settings.get("log_backup_count", 3)), encoding="utf-8", delay=True)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    # LOG_FORMAT never shows the caller, thread or process, so skip looking
+    # them up for every record (see "Optimization" in the logging docs)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    _handler = _DeferredQueueHandler(queue.SimpleQueue())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, str(settings.get("log_level", "INFO")).upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(_handler.queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Write out everything queued, then stop the listener and close the file."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,55 @@
+import os
+import json
+
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "settings.json")
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.dat")
+HISTORY_DB_FILE = os.path.join(os.path.dirname(__file__), "history.db")
+LEGACY_HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.json")
+EVAL_CACHE_FILE = os.path.join(os.path.dirname(__file__), "eval_cache.json")
+LOG_FILE = os.path.join(os.path.dirname(__file__), "app.log")
+
+DEFAULT_SETTINGS = {
+    "theme": "dark",
+    "decimal_precision": 4,
+    "clear_history_on_exit": False,
+    "history_max_entries": 50,
+    "history_backend": "journal",
+    "eval_cache_size": 1024,
+    "eval_cache_persist": False,
+    # largest result (in bits) an expression may be predicted to produce
+    "eval_cost_budget": 1000000,
+    # "float", or "decimal"/"fraction" for exact arithmetic at decimal_precision
+    "precision_mode": "float",
+    # record latency/counter metrics for the Diagnostics dialog
+    "metrics_enabled": False,
+    # app.log is rotated once it reaches log_max_bytes, keeping log_backup_count old files
+    "log_level": "INFO",
+    "log_max_bytes": 1000000,
+    "log_backup_count": 3,
+    # "process": Programmable inputs run in a worker process under these limits;
+    # "thread": in the app process (no memory or CPU limits)
+    "programmable_backend": "process",
+    "sandbox_memory_mb": 1024,
+    "sandbox_cpu_seconds": 10,
+    "sandbox_timeout": 15
+}
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Return the defaults overlaid with whatever settings.json holds."""
+    settings = DEFAULT_SETTINGS.copy()
+    try:
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                settings.update(json.load(f))
+    except Exception:
+        pass
+    return settings
+
+
+def save_settings(settings, path=SETTINGS_FILE):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(settings, f, indent=2)
+    except Exception:
+        pass
@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk
-import math
+import time
+
+from area_formulas import SHAPES, area_of, describe
+from history_record import HistoryRecord
 
 class AreaCalculator:
     def __init__(self, master, history=None, settings=None):
@@ -44,6 +47,10 @@ class AreaCalculator:
         self.save_btn = tk.Button(result_frame, text="Save", command=self.save_to_history, bg="#2ecc71", fg="white", bd=0)
         self.save_btn.pack(side="right")
 
+        # last computed area (None when the inputs are incomplete) and its cost
+        self.last_area = None
+        self.last_duration = 0.0
+
         # --- Input widgets for each shape ---
         self.input_widgets = {}
         self.input_vars = {}
@@ -103,23 +110,15 @@ class AreaCalculator:
         """Calculates the area based on the current inputs and updates the display."""
         shape = self.shape_var.get()
         area = None
+        self.last_area = None
+        start = time.perf_counter()
         try:
-            if shape == 'Circle':
-                radius = float(self.input_widgets['Circle'][0][1].get())
-                area = math.pi * radius**2
-            elif shape == 'Triangle':
-                base = float(self.input_widgets['Triangle'][0][1].get())
-                height = float(self.input_widgets['Triangle'][1][1].get())
-                area = 0.5 * base * height
-            elif shape == 'Square':
-                side = float(self.input_widgets['Square'][0][1].get())
-                area = side**2
-            elif shape == 'Rectangle':
-                length = float(self.input_widgets['Rectangle'][0][1].get())
-                width = float(self.input_widgets['Rectangle'][1][1].get())
-                area = length * width
+            if shape in SHAPES:
+                area = area_of(shape, *[entry.get() for _, entry in self.input_widgets[shape]])
 
             if area is not None:
+                self.last_area = area
+                self.last_duration = time.perf_counter() - start
                 prec = int(self.settings.get("decimal_precision", 4)) if self.settings else 4
                 self.result_label.config(text=f"Area: {area:.{prec}f}")
             else:
@@ -133,7 +132,7 @@ class AreaCalculator:
             self.result_label.config(text=f"Error: {e}")
             if self.history:
                 try:
-                    self.history.add_entry(f"Area calc error: {e}")
+                    self.history.add_entry(HistoryRecord("area", f"{shape} area", f"Error: {e}", error=True))
                 except Exception:
                     pass
 
@@ -142,24 +141,16 @@ class AreaCalculator:
             return
         shape = self.shape_var.get()
         try:
-            if shape == 'Circle':
-                radius = self.input_widgets['Circle'][0][1].get()
-                area_text = self.result_label.cget("text")
-                self.history.add_entry(f"Circle radius={radius} -> {area_text}")
-            elif shape == 'Triangle':
-                base = self.input_widgets['Triangle'][0][1].get()
-                height = self.input_widgets['Triangle'][1][1].get()
-                area_text = self.result_label.cget("text")
-                self.history.add_entry(f"Triangle base={base}, height={height} -> {area_text}")
-            elif shape == 'Square':
-                side = self.input_widgets['Square'][0][1].get()
-                area_text = self.result_label.cget("text")
-                self.history.add_entry(f"Square side={side} -> {area_text}")
-            elif shape == 'Rectangle':
-                length = self.input_widgets['Rectangle'][0][1].get()
-                width = self.input_widgets['Rectangle'][1][1].get()
-                area_text = self.result_label.cget("text")
-                self.history.add_entry(f"Rectangle L={length}, W={width} -> {area_text}")
+            if shape not in SHAPES:
+                return
+            expression = describe(shape, *[entry.get() for _, entry in self.input_widgets[shape]])
+            if self.last_area is not None:
+                prec = int(self.settings.get("decimal_precision", 4)) if self.settings else 4
+                record = HistoryRecord("area", expression, self.last_area, duration=self.last_duration, precision=prec)
+            else:
+                # incomplete input: keep whatever the result label says
+                record = HistoryRecord("area", expression, self.result_label.cget("text"), error=True)
+            self.history.add_entry(record)
         except Exception:
             pass
 
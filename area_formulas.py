@@ -0,0 +1,52 @@
+"""Area formulas behind the Area tab, usable without any UI."""
+import math
+
+from metrics import METRICS
+
+# shape -> dimension names, in the order the tab asks for them
+SHAPES = {
+    "Circle": ("radius",),
+    "Triangle": ("base", "height"),
+    "Square": ("side",),
+    "Rectangle": ("length", "width"),
+}
+
+
+def shape_name(shape: str):
+    """Canonical shape name, accepting any capitalisation ("circle")."""
+    for name in SHAPES:
+        if name.lower() == str(shape).lower():
+            return name
+    raise ValueError(f"unknown shape {shape!r}")
+
+
+@METRICS.timed("eval.area")
+def area_of(shape: str, *dimensions):
+    """Area of shape from its dimensions (numbers or numeric strings).
+
+    Raises ValueError for an unknown shape, a missing dimension or
+    non-numeric input.
+    """
+    shape = shape_name(shape)
+    if len(dimensions) != len(SHAPES[shape]):
+        raise ValueError(f"{shape} needs {', '.join(SHAPES[shape])}")
+    values = [float(d) for d in dimensions]
+    if shape == "Circle":
+        return math.pi * values[0] ** 2
+    if shape == "Triangle":
+        return 0.5 * values[0] * values[1]
+    if shape == "Square":
+        return values[0] ** 2
+    return values[0] * values[1]
+
+
+def describe(shape: str, *dimensions):
+    """Expression text recorded in history, e.g. "Circle radius=2"."""
+    shape = shape_name(shape)
+    if shape == "Circle":
+        return f"Circle radius={dimensions[0]}"
+    if shape == "Triangle":
+        return f"Triangle base={dimensions[0]}, height={dimensions[1]}"
+    if shape == "Square":
+        return f"Square side={dimensions[0]}"
+    return f"Rectangle L={dimensions[0]}, W={dimensions[1]}"
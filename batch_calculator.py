@@ -0,0 +1,160 @@
+"""Headless batch evaluation: one expression per input line, one result per output line.
+
+    python batch_calculator.py formulas.txt
+    cat formulas.txt | python batch_calculator.py --format jsonl --precision 8
+
+    python batch_calculator.py -j 0 --chunk-size 5000 formulas.txt
+
+Input is read lazily and results are written as they are produced, so
+memory use stays constant however long the stream is. Results and error
+messages match the Standard tab; blank lines and lines starting with ``#``
+are skipped. With ``-j`` chunks of lines are evaluated by a process pool
+and written back in input order.
+"""
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app_settings import load_settings, SETTINGS_FILE
+from eval_cache import EvaluationCache
+from evaluation import evaluate_standard
+from history_io import chunked
+from precise_arithmetic import PRECISION_MODES
+
+
+def read_expressions(lines):
+    """Yield (line number, expression) for each non-blank, non-comment line."""
+    for number, line in enumerate(lines, 1):
+        expr = line.strip()
+        if expr and not expr.startswith("#"):
+            yield number, expr
+
+
+def to_json(number: int, outcome):
+    return json.dumps({"line": number, "expression": outcome.expression, "result": outcome.json_result(),
+                       "display": outcome.display, "error": outcome.error}, ensure_ascii=False)
+
+
+def evaluate_stream(lines, settings, cache=None):
+    """Lazily yield (line number, Evaluation) for each expression in lines."""
+    for number, expr in read_expressions(lines):
+        yield number, evaluate_standard(expr, settings, cache)
+
+
+def format_line(number: int, outcome, fmt: str = "text"):
+    return to_json(number, outcome) if fmt == "jsonl" else outcome.display
+
+
+def write_results(results, out, fmt: str = "text"):
+    """Write results to out; return the number of errors."""
+    errors = 0
+    for number, outcome in results:
+        errors += outcome.error
+        out.write(format_line(number, outcome, fmt))
+        out.write("\n")
+    return errors
+
+
+# per-process state of pool workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(settings, fmt):
+    _worker["settings"] = settings
+    _worker["format"] = fmt
+    _worker["cache"] = EvaluationCache(max_size=int(settings.get("eval_cache_size", 1024)))
+
+
+def _evaluate_chunk(chunk):
+    """Evaluate (line number, expression) pairs in a worker; return (text, errors)."""
+    settings, fmt, cache = _worker["settings"], _worker["format"], _worker["cache"]
+    lines = []
+    errors = 0
+    for number, expr in chunk:
+        outcome = evaluate_standard(expr, settings, cache)
+        errors += outcome.error
+        lines.append(format_line(number, outcome, fmt))
+    lines.append("")
+    return "\n".join(lines), errors
+
+
+def evaluate_parallel(lines, settings, fmt: str = "text", workers: int = None, chunk_size: int = 1000,
+                      max_pending: int = None):
+    """Yield (text, errors) for each chunk of lines, in input order.
+
+    Chunks are evaluated by a pool of worker processes that keep their
+    settings, result cache and compiled-expression caches between chunks.
+    At most max_pending chunks (default two per worker) are in flight, so
+    input is never read far ahead of the output being written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(settings, fmt))
+    try:
+        for chunk in chunked(read_expressions(lines), chunk_size):
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_evaluate_chunk, chunk))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Evaluate calculator expressions without the GUI.")
+    parser.add_argument("input", nargs="?", default="-", help="file of expressions, one per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="where to write results (default: stdout)")
+    parser.add_argument("-f", "--format", choices=("text", "jsonl"), default="text")
+    parser.add_argument("-p", "--precision", type=int, help="decimal places (default: decimal_precision setting)")
+    parser.add_argument("-m", "--mode", choices=PRECISION_MODES, help="arithmetic (default: precision_mode setting)")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="settings.json to read defaults from")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 if any expression fails")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes (0: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="lines per chunk sent to a worker")
+    parser.add_argument("--max-pending", type=int, help="chunks in flight at once (default: 2 per worker)")
+    return parser
+
+
+def settings_from_args(args):
+    settings = load_settings(args.settings)
+    if args.precision is not None:
+        settings["decimal_precision"] = args.precision
+    if args.mode is not None:
+        settings["precision_mode"] = args.mode
+    return settings
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = settings_from_args(args)
+    cache = EvaluationCache(max_size=int(settings.get("eval_cache_size", 1024)))
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.jobs == 1:
+            errors = write_results(evaluate_stream(src, settings, cache), out, args.format)
+        else:
+            errors = 0
+            for text, chunk_errors in evaluate_parallel(src, settings, args.format, args.jobs or None,
+                                                        args.chunk_size, args.max_pending):
+                out.write(text)
+                errors += chunk_errors
+    except BrokenPipeError:
+        # downstream (e.g. head) stopped reading
+        return 0
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    return 1 if args.strict and errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
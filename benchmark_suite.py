@@ -0,0 +1,319 @@
+"""Headless benchmarks for the hot paths, with JSON results and baseline comparison.
+
+    python benchmark_suite.py -o bench.json
+    python benchmark_suite.py --baseline bench.json        # exit 1 on a regression
+    python benchmark_suite.py --quick --only eval history
+
+Every result is the best seconds-per-operation over several rounds (as
+``timeit`` reports), so lower is better and background noise only ever
+makes a number worse. History benchmarks run against the same
+HistorySession the History tab uses, in a temporary directory. App startup
+is timed in a fresh interpreter on $DISPLAY, or under Xvfb when it is
+installed; it is skipped otherwise.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+from eval_cache import EvaluationCache
+from evaluation import evaluate_standard, evaluate_scientific, evaluate_function
+from history_journal import HistoryJournal
+from history_record import HistoryRecord
+from history_service import HistorySession
+from programmable_sandbox import ProgrammableSandbox
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GROUPS = ("eval", "history", "programmable", "startup")
+HISTORY_SIZES = (50, 10_000, 1_000_000)
+SETTINGS = {"decimal_precision": 4, "precision_mode": "float"}
+
+
+def best_per_op(fn, ops: int, rounds: int = 5):
+    """Best seconds per operation of fn() (which performs ops operations) over rounds.
+
+    The garbage collector is off while timing, as with timeit.
+    """
+    best = float("inf")
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if enabled:
+            gc.enable()
+    return best / ops
+
+
+# --- expression evaluation ---
+
+def bench_eval(quick=False):
+    n = 500 if quick else 2000
+    results = {}
+    # distinct texts, so each one is parsed, optimized and compiled
+    unique = [f"{i}*({i}+1)/7-{i % 13}**2" for i in range(n)]
+    counter = iter(range(10**9))
+    results["eval.standard.compile"] = best_per_op(
+        lambda: [evaluate_standard(f"{next(counter)}+{e}", SETTINGS) for e in unique], n)
+    # small enough to stay in the compiled-expression caches
+    warm = unique[:256]
+    results["eval.standard.compiled"] = best_per_op(lambda: [evaluate_standard(e, SETTINGS) for e in warm], len(warm))
+    cache = EvaluationCache(max_size=4096)
+    results["eval.standard.cached"] = best_per_op(lambda: [evaluate_standard(e, SETTINGS, cache) for e in warm],
+                                                  len(warm))
+    decimal = dict(SETTINGS, precision_mode="decimal")
+    results["eval.standard.decimal"] = best_per_op(lambda: [evaluate_standard(f"{e}+0.1", decimal) for e in warm],
+                                                   len(warm))
+
+    scientific = [f"sin({i})+sqrt({i}+1)*ln({i}+2)-log({i}+3)" for i in range(256)]
+    results["eval.scientific.compiled"] = best_per_op(
+        lambda: [evaluate_scientific(e, SETTINGS) for e in scientific], len(scientific))
+    results["eval.scientific.function"] = best_per_op(
+        lambda: [evaluate_function("sin", str(i), SETTINGS) for i in range(n)], n)
+    return results
+
+
+# --- history persistence ---
+
+def _fill_journal(path, size: int):
+    journal = HistoryJournal(path, max_entries=size)
+    journal.load()
+    chunk = 10_000
+    for start in range(0, size, chunk):
+        journal.append_many([HistoryRecord("standard", f"{i}+{i}", 2 * i, duration=1e-5)
+                             for i in range(start, min(size, start + chunk))])
+    journal.close()
+
+
+def bench_history(quick=False):
+    results = {}
+    sizes = [s for s in HISTORY_SIZES if not quick or s <= 10_000]
+    root = tempfile.mkdtemp(prefix="calc-bench-")
+    try:
+        for size in sizes:
+            path = os.path.join(root, f"history-{size}.dat")
+            _fill_journal(path, size)
+            copy = path + ".orig"
+            shutil.copyfile(path, copy)
+            shutil.copyfile(path + ".idx", copy + ".idx")
+
+            def load():
+                session = HistorySession(path, max_entries=size)
+                session.close()
+            results[f"history.{size}.load"] = best_per_op(load, 1)
+
+            session = HistorySession(path, max_entries=size)
+            ops = 1000
+            counter = iter(range(10**9))
+            results[f"history.{size}.add_entry"] = best_per_op(
+                lambda: [session.add_entry(HistoryRecord("standard", f"{next(counter)}*2", 4)) for _ in range(ops)],
+                ops)
+
+            def save():
+                # a trim to the window plus the write-out it forces
+                session._save()
+                session.flush()
+            results[f"history.{size}.save"] = best_per_op(save, 1, rounds=3)
+            session.close()
+            for suffix in ("", ".idx"):
+                os.replace(copy + suffix, path + suffix)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+# --- Programmable tab ---
+
+def bench_programmable(quick=False):
+    n = 300 if quick else 1000
+    results = {}
+    sandbox = ProgrammableSandbox(SETTINGS)
+    sandbox.run("def sq(x): return x*x")
+    sandbox.run("y = 3")
+    counter = iter(range(10**9))
+    results["programmable.exec"] = best_per_op(
+        lambda: [sandbox.run(f"def f{next(counter)}(x): return x*2+1") for _ in range(n)], n)
+    results["programmable.assign"] = best_per_op(lambda: [sandbox.run(f"y = {i}") for i in range(n)], n)
+    results["programmable.eval"] = best_per_op(lambda: [sandbox.run("sq(7)+y*2") for _ in range(n)], n)
+    results["programmable.eval_python"] = best_per_op(
+        lambda: [sandbox.run("[sq(i) for i in range(5)]") for _ in range(n)], n)
+
+    # the same inputs through a limited worker process
+    from sandbox_pool import SandboxPool
+    pool = SandboxPool(SETTINGS)
+    try:
+        pool.run("def sq(x): return x*x")
+        pool.run("y = 3")
+        results["programmable.pool_eval"] = best_per_op(lambda: [pool.run("sq(7)+y*2") for _ in range(n)], n)
+        results["programmable.pool_restart"] = best_per_op(lambda: pool._restart("benchmark"), 1, rounds=3)
+    finally:
+        pool.close()
+    return results
+
+
+# --- cold startup ---
+
+_CORE_IMPORT = "import evaluation, scientific_functions, area_formulas, programmable_sandbox, history_service"
+# the app runs against a temporary directory, never the user's settings.json,
+# history or app.log; on_close() stops its threads and the log listener
+_APP_STARTUP = """
+import os, time, shutil, tempfile
+data = tempfile.mkdtemp(prefix="calc-startup-")
+start = time.perf_counter()
+import tkinter as tk
+import app_settings, calculator_app
+for name in ("HISTORY_FILE", "HISTORY_DB_FILE", "LEGACY_HISTORY_FILE", "EVAL_CACHE_FILE", "LOG_FILE"):
+    setattr(calculator_app, name, os.path.join(data, os.path.basename(getattr(app_settings, name))))
+settings_file = os.path.join(data, "settings.json")
+calculator_app.load_settings = lambda: app_settings.load_settings(settings_file)
+calculator_app.save_settings = lambda settings: app_settings.save_settings(settings, settings_file)
+root = tk.Tk()
+app = calculator_app.MainApplication(root)
+root.update()
+print(time.perf_counter() - start)
+app.on_close()
+shutil.rmtree(data, ignore_errors=True)
+"""
+
+
+def _time_subprocess(code, env=None, rounds: int = 5):
+    """Best wall time of a fresh interpreter running code, and what it printed last."""
+    best = float("inf")
+    printed = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, check=True,
+                             capture_output=True, text=True, timeout=120).stdout.split()
+        best = min(best, time.perf_counter() - start)
+        if out:
+            printed = min(float(out[-1]), printed if printed is not None else float("inf"))
+    return best, printed
+
+
+def _start_xvfb():
+    if not shutil.which("Xvfb"):
+        return None, None
+    for number in range(99, 120):
+        if not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+    proc = subprocess.Popen(["Xvfb", f":{number}", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            return proc, f":{number}"
+        time.sleep(0.1)
+    proc.kill()
+    return None, None
+
+
+def bench_startup(quick=False):
+    rounds = 3 if quick else 5
+    results = {}
+    results["startup.interpreter"], _ = _time_subprocess("pass", rounds=rounds)
+    results["startup.core_import"], _ = _time_subprocess(_CORE_IMPORT, rounds=rounds)
+
+    xvfb = None
+    display = os.environ.get("DISPLAY")
+    if not display:
+        xvfb, display = _start_xvfb()
+    if not display:
+        print("startup.app: skipped (no $DISPLAY and no Xvfb)", file=sys.stderr)
+        return results
+    try:
+        env = dict(os.environ, DISPLAY=display)
+        results["startup.app"], results["startup.app.first_window"] = _time_subprocess(_APP_STARTUP, env, rounds)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+    return results
+
+
+BENCHMARKS = {"eval": bench_eval, "history": bench_history, "programmable": bench_programmable,
+              "startup": bench_startup}
+
+
+def run(groups, quick=False):
+    results = {}
+    for group in groups:
+        results.update(BENCHMARKS[group](quick))
+    return {
+        "version": 1,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance: float):
+    """Return [(name, baseline, current, ratio)] for results more than tolerance slower."""
+    regressions = []
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base and current is not None and current > base * (1 + tolerance):
+            regressions.append((name, base, current, current / base))
+    return regressions
+
+
+def _format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def print_report(report, baseline=None, out=sys.stdout):
+    base = (baseline or {}).get("results", {})
+    for name, seconds in report["results"].items():
+        line = f"{name:40} {_format_seconds(seconds):>12}"
+        if base.get(name):
+            line += f"   {seconds / base[name]:6.2f}x baseline"
+        print(line, file=out)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark evaluation, history persistence and startup.")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline (default: %(default)s = 25%%)")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS), help="benchmark groups to run")
+    parser.add_argument("--quick", action="store_true", help="fewer operations; skip the 1M-entry history")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = run(args.only, args.quick)
+    print_report(report, baseline, out=sys.stderr if args.output == "-" else sys.stdout)
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for name, base, current, ratio in regressions:
+            print(f"REGRESSION {name}: {_format_seconds(base)} -> {_format_seconds(current)} ({ratio:.2f}x)",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
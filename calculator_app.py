@@ -1,27 +1,28 @@
-import json
-import os
+import time
+import importlib
+import multiprocessing
 import tkinter as tk
-from tkinter import ttk
-
-# Import the calculator classes from their respective files
-from standard_calculator import StandardCalculator
-from area_calculator import AreaCalculator
-from programmable_calculator import ProgrammableCalculator
-from history_store import CalculationHistory
-from scientific_calculator import ScientificCalculator
+from tkinter import ttk, filedialog
+
+from eval_cache import EvaluationCache
+from history_service import HistorySession
+from metrics import METRICS
+from app_settings import load_settings, save_settings, HISTORY_FILE, HISTORY_DB_FILE, LEGACY_HISTORY_FILE, EVAL_CACHE_FILE, LOG_FILE
+from app_logging import configure_logging, shutdown_logging
 import logging
 
-LOG_FILE = os.path.join(os.path.dirname(__file__), "app.log")
-HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.json")
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format="%(asctime)s %(levelname)s:%(message)s")
+_IMPORTED_AT = time.perf_counter()
 
-SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "settings.json")
+# (key, tab label, module, class, attribute); each tab's module is imported
+# and its widgets built the first time the tab is selected
+TABS = [
+    ("standard", "Standard", "standard_calculator", "StandardCalculator", "standard_calc"),
+    ("area", "Area", "area_calculator", "AreaCalculator", "area_calc"),
+    ("programmable", "Programmable", "programmable_calculator", "ProgrammableCalculator", "prog_calc"),
+    ("scientific", "Scientific", "scientific_calculator", "ScientificCalculator", "scientific_calc"),
+    ("history", "History", "history_store", "CalculationHistory", "history_view"),
+]
 
-DEFAULT_SETTINGS = {
-    "theme": "dark",
-    "decimal_precision": 4,
-    "clear_history_on_exit": False
-}
 
 class MainApplication:
     def __init__(self, master):
@@ -32,6 +33,9 @@ class MainApplication:
 
         # Load settings
         self.settings = self._load_settings()
+        # file writes happen on the logging listener thread
+        configure_logging(self.settings, LOG_FILE)
+        METRICS.enabled = bool(self.settings.get("metrics_enabled", False))
 
         # Top control bar
         self.topbar = tk.Frame(master, bg="#232b36")
@@ -43,64 +47,92 @@ class MainApplication:
         self.settings_btn = tk.Button(self.topbar, text="Settings", command=self.open_settings, bd=0, font=("Arial", 10), bg="#2ecc71", fg="white", padx=10, pady=6, relief="flat")
         self.settings_btn.pack(side="left", padx=5, pady=5)
 
+        self.diagnostics_btn = tk.Button(self.topbar, text="Diagnostics", command=self.open_diagnostics, bd=0, font=("Arial", 10), bg="#2ecc71", fg="white", padx=10, pady=6, relief="flat")
+        self.diagnostics_btn.pack(side="left", padx=5, pady=5)
+
         # Create a Notebook (tabbed interface) with modern styling
         self.style = ttk.Style()
         self._apply_notebook_style(self.settings.get("theme", "dark"))
         self.notebook = ttk.Notebook(master)
         self.notebook.pack(pady=8, padx=8, expand=True, fill="both")
 
-        # Create frames for each tab
-        self.standard_calc_frame = tk.Frame(self.notebook, width=400, height=500)
-        self.area_calc_frame = tk.Frame(self.notebook, width=400, height=500)
-        self.prog_calc_frame = tk.Frame(self.notebook, width=400, height=500)
-        self.scientific_calc_frame = tk.Frame(self.notebook, width=400, height=500)
-        self.history_frame = tk.Frame(self.notebook, width=400, height=500)
-
-        self.standard_calc_frame.pack(fill="both", expand=True)
-        self.area_calc_frame.pack(fill="both", expand=True)
-        self.prog_calc_frame.pack(fill="both", expand=True)
-        self.scientific_calc_frame.pack(fill="both", expand=True)
-        self.history_frame.pack(fill="both", expand=True)
-
-        # Add frames to the notebook
-        self.notebook.add(self.standard_calc_frame, text="Standard")
-        self.notebook.add(self.area_calc_frame, text="Area")
-        self.notebook.add(self.prog_calc_frame, text="Programmable")
-        self.notebook.add(self.scientific_calc_frame, text="Scientific")
-        self.notebook.add(self.history_frame, text="History")
-
-        # Instantiate the shared history manager and calculators
-        self.history = CalculationHistory(self.history_frame, history_file=HISTORY_FILE, max_entries=50)
-
-        # Create instances and keep references for theme/setting updates
-        self.standard_calc = StandardCalculator(self.standard_calc_frame, history=self.history, settings=self.settings)
-        self.area_calc = AreaCalculator(self.area_calc_frame, history=self.history, settings=self.settings)
-        self.prog_calc = ProgrammableCalculator(self.prog_calc_frame, history=self.history, settings=self.settings)
-        self.scientific_calc = ScientificCalculator(self.scientific_calc_frame, history=self.history, settings=self.settings)
-
-        # Apply initial theme
+        # Create an empty frame per tab; the calculators are built on first selection
+        self.tab_frames = {}
+        self.tabs = {}
+        for key, label, _, _, attr in TABS:
+            frame = tk.Frame(self.notebook, width=400, height=500)
+            frame.pack(fill="both", expand=True)
+            self.notebook.add(frame, text=label)
+            self.tab_frames[key] = frame
+            setattr(self, attr, None)
+
+        # Shared history; the calculators write to it whether or not the History tab has been built
+        backend = self.settings.get("history_backend", "journal")
+        with METRICS.time("history.open"):
+            self.history = HistorySession(HISTORY_DB_FILE if backend == "sqlite" else HISTORY_FILE,
+                                          legacy_file=LEGACY_HISTORY_FILE, max_entries=int(self.settings.get("history_max_entries", 50)),
+                                          backend=backend)
+
+        # Result cache shared by the side-effect-free calculators
+        self.eval_cache = EvaluationCache(max_size=int(self.settings.get("eval_cache_size", 1024)),
+                                          path=EVAL_CACHE_FILE if self.settings.get("eval_cache_persist") else None)
+        self.eval_cache.load()
+
+        # Apply initial theme, then build only the tab that is showing
+        self.theme = None
         self.apply_theme(self.settings.get("theme", "dark"))
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self._build_tab(TABS[0][0])
+        master.after_idle(self._report_startup, time.perf_counter())
 
         # Handle exit (clear history on exit setting)
         master.protocol("WM_DELETE_WINDOW", self.on_close)
         logging.info("Application initialized")
 
-    def _load_settings(self):
+    def _on_tab_changed(self, event=None):
         try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    DEFAULT_SETTINGS.update(data)
-            return DEFAULT_SETTINGS.copy()
+            index = self.notebook.index(self.notebook.select())
         except Exception:
-            return DEFAULT_SETTINGS.copy()
+            return
+        self._build_tab(TABS[index][0])
+
+    def _build_tab(self, key: str):
+        if key in self.tabs:
+            return self.tabs[key]
+        _, label, module_name, class_name, attr = next(tab for tab in TABS if tab[0] == key)
+        start = time.perf_counter()
+        with METRICS.time(f"ui.build.{key}"):
+            cls = getattr(importlib.import_module(module_name), class_name)
+            master = self.tab_frames[key]
+            if key == "history":
+                tab = cls(master, session=self.history)
+            elif key in ("standard", "scientific"):
+                tab = cls(master, history=self.history, settings=self.settings, cache=self.eval_cache)
+            else:
+                tab = cls(master, history=self.history, settings=self.settings)
+            # tabs built late still get the current theme
+            if self.theme is not None:
+                try:
+                    tab.apply_theme(self.theme)
+                except Exception:
+                    pass
+        self.tabs[key] = tab
+        setattr(self, attr, tab)
+        logging.info("%s tab built in %.1f ms", label, (time.perf_counter() - start) * 1000)
+        return tab
+
+    def _report_startup(self, constructed_at: float):
+        # runs once Tk is idle, i.e. after the first window has been drawn
+        now = time.perf_counter()
+        METRICS.observe("ui.startup", now - _IMPORTED_AT)
+        logging.info("First window interactive in %.1f ms (%.1f ms after construction)",
+                     (now - _IMPORTED_AT) * 1000, (now - constructed_at) * 1000)
+
+    def _load_settings(self):
+        return load_settings()
 
     def _save_settings(self):
-        try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.settings, f, indent=2)
-        except Exception:
-            pass
+        save_settings(self.settings)
 
     def _apply_notebook_style(self, theme_name: str):
         """Apply modern tab styling based on theme"""
@@ -129,6 +161,7 @@ class MainApplication:
         self._save_settings()
         self.apply_theme(new)
 
+    @METRICS.timed("ui.apply_theme")
     def apply_theme(self, theme_name: str):
         # Basic theme application: set colors and notify calculators/history
         if theme_name == "light":
@@ -145,21 +178,17 @@ class MainApplication:
             self.topbar.configure(bg=theme["bg"])
             self.theme_btn.configure(bg=theme["accent"], fg="white")
             self.settings_btn.configure(bg=theme["accent"], fg="white")
+            self.diagnostics_btn.configure(bg=theme["accent"], fg="white")
         except Exception:
             pass
 
-        # Propagate theme
-        try:
-            self.standard_calc.apply_theme(theme)
-            self.area_calc.apply_theme(theme)
-            self.prog_calc.apply_theme(theme)
+        # Propagate theme to the tabs built so far; the rest get it when built
+        self.theme = theme
+        for tab in self.tabs.values():
             try:
-                self.scientific_calc.apply_theme(theme)
+                tab.apply_theme(theme)
             except Exception:
                 pass
-            self.history.apply_theme(theme)
-        except Exception:
-            pass
 
     def open_settings(self):
         # Simple settings dialog
@@ -173,36 +202,100 @@ class MainApplication:
 
         tk.Label(dlg, text="Decimal precision:").grid(row=1, column=0, sticky="w", padx=8, pady=8)
         prec_var = tk.IntVar(value=self.settings.get("decimal_precision", 4))
-        tk.Spinbox(dlg, from_=0, to=10, textvariable=prec_var, width=5).grid(row=1, column=1, padx=8, pady=8)
+        tk.Spinbox(dlg, from_=0, to=30, textvariable=prec_var, width=5).grid(row=1, column=1, padx=8, pady=8)
+
+        tk.Label(dlg, text="Arithmetic:").grid(row=2, column=0, sticky="w", padx=8, pady=8)
+        mode_var = tk.StringVar(value=self.settings.get("precision_mode", "float"))
+        from precise_arithmetic import PRECISION_MODES
+        tk.OptionMenu(dlg, mode_var, *PRECISION_MODES).grid(row=2, column=1, padx=8, pady=8)
 
         clear_var = tk.BooleanVar(value=self.settings.get("clear_history_on_exit", False))
-        tk.Checkbutton(dlg, text="Clear history on exit", variable=clear_var).grid(row=2, column=0, columnspan=2, padx=8, pady=8)
+        tk.Checkbutton(dlg, text="Clear history on exit", variable=clear_var).grid(row=3, column=0, columnspan=2, padx=8, pady=8)
 
         def save_and_close():
             self.settings["theme"] = theme_var.get()
             self.settings["decimal_precision"] = int(prec_var.get())
+            self.settings["precision_mode"] = mode_var.get()
             self.settings["clear_history_on_exit"] = bool(clear_var.get())
             self._save_settings()
             self.apply_theme(self.settings["theme"])
             dlg.destroy()
 
-        tk.Button(dlg, text="Save", command=save_and_close, bg="#2ecc71", fg="white").grid(row=3, column=0, columnspan=2, pady=8)
+        tk.Button(dlg, text="Save", command=save_and_close, bg="#2ecc71", fg="white").grid(row=4, column=0, columnspan=2, pady=8)
+
+    def open_diagnostics(self):
+        # Latency and counter metrics recorded since start (or the last reset)
+        dlg = tk.Toplevel(self.master)
+        dlg.title("Diagnostics")
+        dlg.transient(self.master)
+
+        text = tk.Text(dlg, width=72, height=20, font=("Consolas", 10))
+        text.grid(row=0, column=0, columnspan=4, padx=8, pady=8, sticky="nsew")
+        dlg.grid_rowconfigure(0, weight=1)
+        dlg.grid_columnconfigure(0, weight=1)
+
+        def refresh():
+            text.configure(state="normal")
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, METRICS.report())
+            text.configure(state="disabled")
+
+        def reset():
+            METRICS.reset()
+            refresh()
+
+        def dump():
+            path = filedialog.asksaveasfilename(parent=dlg, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")], initialfile="metrics.json")
+            if path:
+                try:
+                    METRICS.dump(path)
+                except Exception:
+                    logging.exception("Could not write metrics")
+
+        enabled_var = tk.BooleanVar(value=METRICS.enabled)
+
+        def toggle():
+            METRICS.enabled = bool(enabled_var.get())
+            self.settings["metrics_enabled"] = METRICS.enabled
+            self._save_settings()
+            refresh()
+
+        tk.Checkbutton(dlg, text="Record metrics", variable=enabled_var, command=toggle).grid(row=1, column=0, sticky="w", padx=8, pady=8)
+        tk.Button(dlg, text="Refresh", command=refresh).grid(row=1, column=1, padx=4, pady=8)
+        tk.Button(dlg, text="Reset", command=reset).grid(row=1, column=2, padx=4, pady=8)
+        tk.Button(dlg, text="Save JSON...", command=dump, bg="#2ecc71", fg="white").grid(row=1, column=3, padx=8, pady=8)
+        refresh()
 
     def on_close(self):
         try:
             if self.settings.get("clear_history_on_exit") and self.history:
                 self.history.clear()
-            # ensure saved
+            # stop the Programmable tab's worker (and its sandbox processes)
+            if self.prog_calc is not None:
+                try:
+                    self.prog_calc.close()
+                except Exception:
+                    pass
+            # flush pending writes and stop the history writer thread
+            try:
+                self.history.close()
+            except Exception:
+                pass
             try:
-                self.history._save()
+                self.eval_cache.save()
+                logging.info("Evaluation cache: %s", self.eval_cache.stats())
             except Exception:
                 pass
             logging.info("Application exiting")
+            shutdown_logging()
         except Exception:
             pass
         self.master.destroy()
 
 if __name__ == "__main__":
+    # sandbox worker processes re-enter here in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = MainApplication(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""Local JSON-lines evaluation service.
+
+    python calculator_server.py --tcp 127.0.0.1:8765
+    python calculator_server.py --unix /tmp/calculator.sock
+
+Each request is one JSON object per line; each response carries the
+request's ``id``. Clients may pipeline any number of requests on one
+connection, and responses are sent as soon as each is ready, so they can
+arrive out of order:
+
+    {"id": 1, "op": "evaluate", "expression": "2*(3+4)", "mode": "standard", "record": true}
+    {"id": 2, "op": "area", "shape": "circle", "dimensions": [2]}
+    {"id": 3, "op": "history", "mode": "standard", "expression": "1+1", "result": 2}
+    {"id": 4, "op": "stats"}
+
+Cheap evaluations are micro-batched onto one worker thread; expressions
+the cost estimator predicts to be expensive go to a separate process so
+they never hold up the rest. History appends are coalesced by the history
+writer. When the GUI runs at the same time, use the "sqlite" history
+backend so both can write.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app_settings import load_settings, SETTINGS_FILE, HISTORY_FILE, HISTORY_DB_FILE, LEGACY_HISTORY_FILE
+from area_formulas import SHAPES, area_of, describe, shape_name
+from eval_cache import EvaluationCache
+from evaluation import Evaluation, evaluate_standard, evaluate_scientific
+from expression_cost import CostEstimator, DEFAULT_BUDGET
+from expression_engine import parse
+from history_journal import HistoryJournal, HistoryWriter
+from history_record import HistoryRecord, MODES
+from history_sqlite import SQLiteHistoryJournal
+from metrics import METRICS
+from precise_arithmetic import FractionCostEstimator
+
+EVALUATORS = {"standard": evaluate_standard, "scientific": evaluate_scientific}
+
+# settings of the process running slow evaluations, set by _init_worker
+_worker_settings = {}
+
+
+def _init_worker(settings):
+    _worker_settings.update(settings)
+
+
+def _evaluate_in_worker(expr: str, mode: str):
+    return EVALUATORS[mode](expr, _worker_settings)
+
+
+class RequestError(Exception):
+    """A malformed request; reported back to the client as ok=false."""
+
+
+class CalculatorServer:
+    def __init__(self, settings, history=True, max_batch: int = 256, batch_window: float = 0.001,
+                 slow_bits: int = 100_000, slow_workers: int = 1):
+        self.log = logging.getLogger(__name__)
+        self.settings = settings
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        # predicted result size (bits) above which an expression takes the slow lane
+        self.slow_bits = slow_bits
+        self.cache = EvaluationCache(max_size=int(settings.get("eval_cache_size", 1024)))
+        estimator = FractionCostEstimator if settings.get("precision_mode") == "fraction" else CostEstimator
+        self.estimator = estimator(int(settings.get("eval_cost_budget", DEFAULT_BUDGET)))
+        self.stats = {"requests": 0, "batches": 0, "batched": 0, "slow": 0, "history": 0}
+
+        self._fast_pool = ThreadPoolExecutor(1, thread_name_prefix="calc-eval")
+        self._slow_pool = ProcessPoolExecutor(slow_workers, initializer=_init_worker, initargs=(settings,))
+        self._queue = None
+        self._batcher = None
+
+        self.journal = None
+        self.writer = None
+        if history:
+            backend = settings.get("history_backend", "journal")
+            journal_cls = SQLiteHistoryJournal if backend == "sqlite" else HistoryJournal
+            self.journal = journal_cls(HISTORY_DB_FILE if backend == "sqlite" else HISTORY_FILE,
+                                       max_entries=int(settings.get("history_max_entries", 50)),
+                                       legacy_path=LEGACY_HISTORY_FILE)
+            self.journal.load()
+            self.writer = HistoryWriter(self.journal)
+
+    async def start(self, host=None, port=None, path=None):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        if path:
+            return await asyncio.start_unix_server(self.handle_client, path=path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._fast_pool.shutdown(wait=False, cancel_futures=True)
+        self._slow_pool.shutdown(wait=False, cancel_futures=True)
+        if self.writer is not None:
+            self.writer.close()
+            self.journal.close()
+
+    # --- connections ---
+
+    async def handle_client(self, reader, writer):
+        pending = set()
+        # bound the requests one connection may have in flight
+        slots = asyncio.Semaphore(1024)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                task = asyncio.ensure_future(self._respond(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def _respond(self, line: bytes, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            request_id = request.get("id")
+            response = await self.dispatch(request)
+            response = {"id": request_id, "ok": True, **response}
+        except (RequestError, ValueError, TypeError) as e:
+            response = {"id": request_id, "ok": False, "message": str(e)}
+        except Exception as e:
+            self.log.exception("Request failed")
+            response = {"id": request_id, "ok": False, "message": f"internal error: {e}"}
+        writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    async def dispatch(self, request):
+        self.stats["requests"] += 1
+        op = request.get("op", "evaluate")
+        if op == "evaluate":
+            mode = request.get("mode", "standard")
+            if mode not in EVALUATORS:
+                raise RequestError(f"unknown mode {mode!r}")
+            expr = str(request.get("expression", "")).strip()
+            if not expr:
+                raise RequestError("missing expression")
+            outcome = await self.evaluate(expr, mode)
+            if request.get("record"):
+                self.append_history([outcome.record(mode)])
+            return {"result": outcome.json_result(), "display": outcome.display, "error": outcome.error}
+        if op == "area":
+            return self.area(request)
+        if op == "history":
+            entries = request.get("entries", [request])
+            self.append_history([self._history_record(e) for e in entries])
+            return {"appended": len(entries)}
+        if op == "stats":
+            return {"stats": dict(self.stats, cache=self.cache.stats()), "metrics": METRICS.snapshot()}
+        if op == "ping":
+            return {}
+        raise RequestError(f"unknown op {op!r}")
+
+    # --- evaluation ---
+
+    async def evaluate(self, expr: str, mode: str = "standard"):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((expr, mode, future))
+        return await future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window:
+                # let a burst of pipelined requests pile up behind the first
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.stats["batches"] += 1
+            self.stats["batched"] += len(batch)
+            try:
+                outcomes = await loop.run_in_executor(self._fast_pool, self._evaluate_batch,
+                                                      [(expr, mode) for expr, mode, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (expr, mode, future), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if outcome is None:
+                    asyncio.ensure_future(self._evaluate_slow(expr, mode, future))
+                else:
+                    future.set_result(outcome)
+
+    def _evaluate_batch(self, items):
+        """Evaluate cheap items on the worker thread; None marks one for the slow lane."""
+        return [None if self._is_slow(expr) else EVALUATORS[mode](expr, self.settings, self.cache)
+                for expr, mode in items]
+
+    def _is_slow(self, expr: str):
+        try:
+            bits = self.estimator.check(parse(expr))
+        except Exception:
+            # parse errors and over-budget input fail fast on the cheap lane
+            return False
+        return bits is not None and bits > self.slow_bits
+
+    async def _evaluate_slow(self, expr: str, mode: str, future):
+        self.stats["slow"] += 1
+        start = time.perf_counter()
+        try:
+            outcome = await asyncio.get_running_loop().run_in_executor(
+                self._slow_pool, _evaluate_in_worker, expr, mode)
+        except Exception as e:
+            outcome = Evaluation(expr, None, f"Error: {e}", error=True, duration=time.perf_counter() - start)
+        if not future.done():
+            future.set_result(outcome)
+
+    # --- area and history ---
+
+    def area(self, request):
+        shape = shape_name(request.get("shape", ""))
+        dimensions = request.get("dimensions")
+        if dimensions is None:
+            dimensions = [request.get(name) for name in SHAPES[shape]]
+        if isinstance(dimensions, dict):
+            dimensions = [dimensions.get(name) for name in SHAPES[shape]]
+        start = time.perf_counter()
+        value = area_of(shape, *dimensions)
+        prec = int(self.settings.get("decimal_precision", 4))
+        if request.get("record"):
+            self.append_history([HistoryRecord("area", describe(shape, *dimensions), value,
+                                               duration=time.perf_counter() - start, precision=prec)])
+        return {"result": value, "display": f"Area: {value:.{prec}f}", "error": False}
+
+    def _history_record(self, entry):
+        if not isinstance(entry, dict) or "expression" not in entry:
+            raise RequestError("history entries need an expression")
+        mode = entry.get("mode", "text")
+        if mode not in MODES:
+            raise RequestError(f"unknown history mode {mode!r}")
+        return HistoryRecord(mode, str(entry["expression"]), entry.get("result"), error=bool(entry.get("error")),
+                             duration=float(entry.get("duration") or 0.0), precision=entry.get("precision"))
+
+    def append_history(self, records):
+        if self.writer is None or not records:
+            return
+        # the writer thread coalesces these into one journal write per interval
+        self.writer.append_many(records)
+        self.stats["history"] += len(records)
+        if self.writer.needs_compaction():
+            self.writer.trim(self.journal.max_entries)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve calculator evaluation over a local socket.")
+    parser.add_argument("--tcp", default="127.0.0.1:8765", help="host:port to listen on (default: %(default)s)")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="settings.json to read")
+    parser.add_argument("--no-history", action="store_true", help="do not open the history store")
+    parser.add_argument("--batch-size", type=int, default=256, help="largest evaluation micro-batch")
+    parser.add_argument("--batch-window", type=float, default=1.0, help="ms to wait for a batch to fill")
+    parser.add_argument("--metrics", action="store_true", help="record latency metrics (reported by the stats op)")
+    return parser
+
+
+async def serve(args):
+    settings = load_settings(args.settings)
+    METRICS.enabled = args.metrics or bool(settings.get("metrics_enabled"))
+    server = CalculatorServer(settings, history=not args.no_history,
+                              max_batch=args.batch_size, batch_window=args.batch_window / 1000.0)
+    try:
+        if args.unix:
+            listener = await server.start(path=args.unix)
+        else:
+            host, _, port = args.tcp.rpartition(":")
+            listener = await server.start(host or "127.0.0.1", int(port))
+        logging.info("Calculator server listening on %s", args.unix or args.tcp)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from expression_cost import DEFAULT_BUDGET
+from expression_optimizer import compile_optimized
+
+
+class EvaluationCache:
+    """Bounded LRU cache of evaluation results for side-effect-free modes.
+
+    Expressions are keyed by the canonical form of their AST, so ``2+3``,
+    ``( 2 + 3 )`` and ``2^3`` versus ``2**3`` share an entry. Only successful
+    int/float results are cached; errors are cheap to reproduce. When a path
+    is given the cache can be saved and reloaded across restarts.
+    """
+
+    def __init__(self, max_size: int = 1024, path=None):
+        self.log = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_compute(self, key: str, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = compute()
+        if type(value) in (int, float):
+            with self._lock:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+        return value
+
+    def evaluate(self, text: str, budget: int = DEFAULT_BUDGET):
+        """Evaluate expression text, reusing the result of an equivalent earlier one."""
+        compiled = compile_optimized(text, budget=budget)
+        return self.get_or_compute(compiled.key, compiled)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._data),
+                "max_size": self.max_size,
+            }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                for key, value in data[-self.max_size:]:
+                    if type(value) in (int, float):
+                        self._data[key] = value
+        except Exception:
+            self.log.warning("Could not load evaluation cache from %s", self.path)
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with self._lock:
+                # skip ints too long for int->str conversion
+                items = [(k, v) for k, v in self._data.items() if type(v) is float or v.bit_length() < 14000]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            self.log.warning("Could not save evaluation cache to %s", self.path)
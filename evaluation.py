@@ -0,0 +1,163 @@
+"""Tk-free evaluation of calculator input.
+
+Shared by the Standard and Scientific tabs and the headless tools, so all
+of them show the same results and the same error messages.
+"""
+import time
+
+from expression_cost import CostEstimator, DEFAULT_BUDGET, ExpressionTooExpensive
+from expression_engine import FUNCTIONS
+from expression_optimizer import compile_optimized
+from history_record import HistoryRecord
+from metrics import METRICS
+from precise_arithmetic import evaluate_precise, format_precise
+from scientific_functions import BUTTONS
+
+
+class Evaluation:
+    """Outcome of evaluating one expression: raw result and display text."""
+
+    __slots__ = ("expression", "result", "display", "error", "precision", "duration")
+
+    def __init__(self, expression, result, display, error=False, precision=None, duration=0.0):
+        self.expression = expression
+        self.result = result
+        self.display = display
+        self.error = error
+        self.precision = precision
+        self.duration = duration
+
+    def json_result(self):
+        """The result as a JSON value; Decimal/Fraction and very wide ints as their display text."""
+        result = self.result
+        if self.error:
+            return None
+        if type(result) not in (int, float) or type(result) is int and result.bit_length() > 64:
+            return self.display
+        return result
+
+    def record(self, mode: str = "standard"):
+        if self.error:
+            return HistoryRecord(mode, self.expression, self.display, error=True, duration=self.duration)
+        return HistoryRecord(mode, self.expression, self.result, duration=self.duration, precision=self.precision)
+
+    def __repr__(self):
+        return f"Evaluation({self.expression!r}, {self.display!r})"
+
+
+def error_message(exc):
+    """The message the calculators show for an evaluation error."""
+    if isinstance(exc, ZeroDivisionError):
+        return "Error: Divide by zero"
+    if isinstance(exc, (SyntaxError, NameError)):
+        return "Error: Invalid expression"
+    return f"Error: {exc}"
+
+
+def evaluate_value(expr: str, settings=None, cache=None):
+    """Raw result of expr in the configured precision mode; raises on error."""
+    settings = settings or {}
+    budget = int(settings.get("eval_cost_budget", DEFAULT_BUDGET))
+    native = (lambda text: cache.evaluate(text, budget)) if cache is not None else \
+        (lambda text: compile_optimized(text, budget=budget)())
+    return evaluate_precise(expr, settings.get("precision_mode", "float"),
+                            int(settings.get("decimal_precision", 4)), native, budget)
+
+
+@METRICS.timed("eval.standard")
+def evaluate_standard(expr: str, settings=None, cache=None):
+    """Evaluate a Standard-tab expression under settings; never raises."""
+    settings = settings or {}
+    start = time.perf_counter()
+    try:
+        result = evaluate_value(expr, settings, cache)
+        # format floats according to settings
+        prec = None
+        if isinstance(result, float) and "decimal_precision" in settings:
+            prec = int(settings.get("decimal_precision", 4))
+            display = f"{result:.{prec}f}"
+        elif type(result) not in (int, float, complex):
+            # Decimal/Fraction: history keeps the text as displayed
+            display = result = format_precise(result, int(settings.get("decimal_precision", 4)))
+        else:
+            display = str(result)
+        return Evaluation(expr, result, display, precision=prec, duration=time.perf_counter() - start)
+    except Exception as e:
+        return Evaluation(expr, None, error_message(e), error=True, duration=time.perf_counter() - start)
+
+
+@METRICS.timed("eval.scientific")
+def evaluate_scientific(expr: str, settings=None, cache=None):
+    """Evaluate a Scientific-tab expression: floats always shown at decimal_precision."""
+    settings = settings or {}
+    start = time.perf_counter()
+    try:
+        result = evaluate_value(expr, settings, cache)
+        prec = int(settings.get("decimal_precision", 4))
+        if isinstance(result, float):
+            display = f"{result:.{prec}f}"
+        elif type(result) not in (int, complex):
+            display = result = format_precise(result, prec)
+        else:
+            display = str(result)
+        return Evaluation(expr, result, display, precision=prec, duration=time.perf_counter() - start)
+    except ZeroDivisionError:
+        message = "Error: Divide by zero"
+    except ExpressionTooExpensive as e:
+        message = f"Error: {e}"
+    except Exception:
+        message = "Error: invalid expression"
+    return Evaluation(expr, None, message, error=True, duration=time.perf_counter() - start)
+
+
+def _call(fname, arg, cache=None):
+    fn = FUNCTIONS[fname]
+    if cache is None:
+        return fn(arg)
+    return cache.get_or_compute(f"{fname}({arg!r})", lambda: fn(arg))
+
+
+@METRICS.timed("eval.function")
+def evaluate_function(name: str, text: str, settings=None, cache=None, exponent=None):
+    """Apply a Scientific-tab function button (sin, !, x^y, ...) to the value of text.
+
+    x^y takes its exponent from "base,exponent" text or from exponent.
+    Never raises; the record's expression reads like "sin(30)".
+    """
+    settings = settings or {}
+    start = time.perf_counter()
+    expression = f"{name}({text})"
+    try:
+        if name == "x^y" and "," in text:
+            base_text, exp_text = text.split(",", 1)
+            base = float(evaluate_value(base_text, settings, cache))
+            exponent = float(evaluate_value(exp_text, settings, cache))
+        else:
+            base = float(evaluate_value(text, settings, cache))
+    except ExpressionTooExpensive as e:
+        return Evaluation(expression, None, f"Error: {e}", error=True, duration=time.perf_counter() - start)
+    except Exception:
+        return Evaluation(expression, None, "Error: invalid input", error=True, duration=time.perf_counter() - start)
+
+    try:
+        if name == "!":
+            # refuse factorials too big to compute before they freeze the caller
+            CostEstimator(int(settings.get("eval_cost_budget", DEFAULT_BUDGET))).check_factorial(int(base))
+            res = _call("fact", int(base), cache)
+        elif name in BUTTONS:
+            # same functions the expression engine uses (trig in degrees)
+            res = _call(BUTTONS[name], base, cache)
+        elif name == "x^y":
+            if exponent is None:
+                raise ValueError("missing exponent")
+            res = base ** float(exponent)
+        else:
+            raise ValueError(f"unknown function {name!r}")
+        prec = int(settings.get("decimal_precision", 4))
+        display = f"{res:.{prec}f}" if isinstance(res, float) else str(res)
+        return Evaluation(expression, res, display, precision=prec, duration=time.perf_counter() - start)
+    except ValueError:
+        message = "Error: invalid input"
+    except Exception as e:
+        message = f"Error: {e}"
+    return Evaluation(expression, None, message, error=True, duration=time.perf_counter() - start)
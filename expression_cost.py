@@ -0,0 +1,209 @@
+"""Static cost estimate for expression ASTs.
+
+Walks a parsed expression before anything is evaluated and bounds the size
+of every intermediate result as an upper bound on log2|value| ("bits").
+Integer ``**`` and factorials are the only operations whose results grow
+without limit (floats overflow instead), so those are what the estimate
+tracks; values it cannot know statically (variables, user functions) are
+not judged.
+"""
+import math
+
+from expression_engine import Num, Name, UnaryOp, BinOp, Call, FUNCTIONS, CONSTANTS
+
+# default budget: results up to about 300,000 decimal digits
+DEFAULT_BUDGET = 1_000_000
+
+_LOG2_10 = math.log2(10)
+# a float's magnitude is bounded by its exponent range
+_FLOAT_BITS = 1024.0
+_FACTORIALS = ("fact", "math.factorial")
+_INT_FUNCTIONS = ("math.comb", "math.perm", "math.isqrt", "math.gcd", "math.lcm")
+# turn a float (at most _FLOAT_BITS) into an int of the same size
+_ROUNDING = ("math.floor", "math.ceil", "math.trunc")
+
+
+class ExpressionTooExpensive(ArithmeticError):
+    """Raised when an expression's predicted result exceeds the cost budget."""
+
+    def __init__(self, bits: float, budget: int):
+        self.bits = bits
+        self.budget = budget
+        if math.isinf(bits):
+            size = "unbounded"
+        else:
+            size = f"about {int(bits / _LOG2_10) + 1:,} digits"
+        super().__init__(f"result too large ({size})")
+
+
+def int_bits(value: int):
+    value = abs(value)
+    if value <= 1:
+        return 0.0
+    if value.bit_length() < 1000:
+        return math.log2(value)
+    return float(value.bit_length())
+
+
+def pow2(bits: float):
+    """Upper bound on a value given its bits, without overflowing."""
+    return 2.0 ** bits if bits < _FLOAT_BITS else math.inf
+
+
+def factorial_bits(n: float):
+    """Upper bound on log2(n!)."""
+    if n < 2:
+        return 0.0
+    if math.isinf(n):
+        return math.inf
+    return math.lgamma(n + 1) / math.log(2)
+
+
+def sign(node):
+    """-1, 0 or 1 when node's sign follows from its literals alone, else None.
+
+    >>> from expression_engine import parse
+    >>> sign(parse("-(-10**7)")), sign(parse("-2**3")), sign(parse("3-5")), sign(parse("x"))
+    (1, -1, None, None)
+    """
+    if isinstance(node, Num):
+        if isinstance(node.value, complex):
+            return None
+        return (node.value > 0) - (node.value < 0)
+    if isinstance(node, UnaryOp):
+        s = sign(node.operand)
+        if s is None:
+            return None
+        return -s if node.op == "-" else s
+    if isinstance(node, BinOp):
+        left, right = sign(node.left), sign(node.right)
+        if left is None or right is None:
+            return None
+        if node.op == "*" or node.op == "/" and right:
+            return left * right
+        if node.op in ("+", "-"):
+            if node.op == "-":
+                right = -right
+            if left == right or not right:
+                return left
+            if not left:
+                return right
+        if node.op == "**" and left == 1:
+            return 1
+    return None
+
+
+class CostEstimator:
+    """Bound intermediate result sizes and reject anything over ``budget`` bits.
+
+    An exponent only counts as negative (giving a float) when it provably is:
+
+    >>> from expression_engine import parse
+    >>> CostEstimator().check(parse("7**-(-10**7)"))
+    Traceback (most recent call last):
+      ...
+    expression_cost.ExpressionTooExpensive: result too large (about 8,450,981 digits)
+    >>> CostEstimator().check(parse("7**-(10**7)"))
+    1024.0
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, functions=None, constants=None):
+        self.budget = budget
+        self.functions = FUNCTIONS if functions is None else functions
+        self.constants = CONSTANTS if constants is None else constants
+
+    def check(self, tree):
+        """Raise ExpressionTooExpensive if tree might blow the budget; return its bound."""
+        return self.estimate(tree)[1]
+
+    def check_factorial(self, n):
+        bits = factorial_bits(abs(n))
+        if bits > self.budget:
+            raise ExpressionTooExpensive(bits, self.budget)
+        return bits
+
+    def estimate(self, node):
+        """Return (kind, bits): kind is "int", "float" or None when unknown."""
+        kind, bits = self._estimate(node)
+        if kind == "float":
+            bits = min(bits, _FLOAT_BITS)
+        elif bits is not None and bits > self.budget:
+            raise ExpressionTooExpensive(bits, self.budget)
+        return kind, bits
+
+    def _estimate(self, node):
+        if isinstance(node, Num):
+            value = node.value
+            if type(value) is int:
+                return "int", int_bits(value)
+            if isinstance(value, float) and math.isfinite(value) and value:
+                return "float", max(math.log2(abs(value)), 0.0)
+            return "float", 0.0
+        if isinstance(node, Name):
+            if node.id in self.constants:
+                return "float", 2.0
+            return None, None
+        if isinstance(node, UnaryOp):
+            return self.estimate(node.operand)
+        if isinstance(node, BinOp):
+            return self._binop(node)
+        if isinstance(node, Call):
+            return self._call(node)
+        return None, None
+
+    def _binop(self, node):
+        lkind, lbits = self.estimate(node.left)
+        rkind, rbits = self.estimate(node.right)
+        if lkind is None or rkind is None:
+            return None, None
+        return self._combine(node, lkind, lbits, rkind, rbits)
+
+    def _combine(self, node, lkind, lbits, rkind, rbits):
+        """(kind, bits) of node.op applied to operands of the given kinds and bits."""
+        kind = "int" if lkind == rkind == "int" else "float"
+        op = node.op
+        if op in ("+", "-"):
+            return kind, max(lbits, rbits) + 1
+        if op == "*":
+            return kind, lbits + rbits
+        if op == "/":
+            return "float", _FLOAT_BITS
+        if op == "//":
+            return kind, lbits
+        if op == "%":
+            return kind, rbits
+        if op == "**":
+            if kind != "int" or sign(node.right) == -1:
+                # float pow overflows quickly rather than hanging
+                return "float", _FLOAT_BITS
+            if lbits == 0:
+                return "int", 0.0
+            return "int", lbits * pow2(rbits)
+        return None, None
+
+    def _call(self, node):
+        args = [self.estimate(a) for a in node.args]
+        if node.func not in self.functions:
+            return None, None
+        if any(kind is None for kind, _ in args):
+            return None, None
+        bits = [b for _, b in args]
+        if node.func in _FACTORIALS and bits:
+            return "int", factorial_bits(pow2(bits[0]))
+        if node.func in _INT_FUNCTIONS and bits:
+            if node.func in ("math.comb", "math.perm"):
+                # both are at most n**k
+                k = pow2(bits[1]) if len(bits) > 1 else pow2(bits[0])
+                return "int", bits[0] * k
+            if node.func == "math.isqrt":
+                return "int", bits[0] / 2
+            return "int", sum(bits)
+        if node.func in _ROUNDING or (node.func == "round" and len(bits) == 1):
+            return "int", bits[0]
+        if node.func in ("abs", "round"):
+            return args[0][0], bits[0]
+        if node.func in ("min", "max"):
+            # either argument may be the result, so an int one makes it int
+            kinds = {kind for kind, _ in args}
+            return ("int" if "int" in kinds else "float"), max(bits, default=0.0)
+        return "float", _FLOAT_BITS
@@ -0,0 +1,315 @@
+"""Tokenizer, Pratt parser and closure compiler shared by the calculators.
+
+Expressions are parsed once into a small AST and compiled into a tree of
+closures, so evaluating them again is far cheaper than ``eval()``. Parse
+errors raise SyntaxError and unknown names NameError, as ``eval`` did.
+"""
+import re
+import math
+import operator
+
+from scientific_functions import SCIENTIFIC_FUNCTIONS
+
+
+FUNCTIONS = dict(SCIENTIFIC_FUNCTIONS, abs=abs, round=round, min=min, max=max)
+# math.* is available too, with its usual (radian) semantics
+FUNCTIONS.update({f"math.{name}": fn for name, fn in vars(math).items()
+                  if callable(fn) and not name.startswith("_")})
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+CONSTANTS.update({f"math.{name}": getattr(math, name) for name in ("pi", "e", "tau", "inf", "nan")})
+
+# what plain Python code (the Programmable tab) sees without any imports
+PYTHON_FUNCTIONS = {name: fn for name, fn in FUNCTIONS.items() if name.startswith("math.")}
+PYTHON_CONSTANTS = {name: value for name, value in CONSTANTS.items() if name.startswith("math.")}
+PYTHON_CONSTANTS.update({"True": True, "False": False, "None": None})
+
+BINARY_OPS = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "//": operator.floordiv, "%": operator.mod, "**": operator.pow,
+}
+UNARY_OPS = {"-": operator.neg, "+": operator.pos}
+
+
+# --- tokenizer ---
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)
+      | (?P<op>\*\*|//|[-+*/%^()!,])
+    )""", re.VERBOSE)
+
+
+class Token:
+    __slots__ = ("kind", "value", "pos")
+
+    def __init__(self, kind, value, pos):
+        self.kind = kind
+        self.value = value
+        self.pos = pos
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.value!r})"
+
+
+def tokenize(text: str):
+    tokens = []
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise SyntaxError(f"unexpected character {text[pos:].lstrip()[:1]!r}")
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "num":
+            value = float(value) if any(c in value for c in ".eE") else int(value)
+        elif kind == "op" and value == "^":
+            value = "**"
+        tokens.append(Token(kind, value, m.start(kind)))
+        pos = m.end()
+    tokens.append(Token("end", None, end))
+    return tokens
+
+
+# --- AST ---
+
+class Node:
+    __slots__ = ()
+
+
+class Num(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Num({self.value!r})"
+
+
+class Name(Node):
+    __slots__ = ("id",)
+
+    def __init__(self, id):
+        self.id = id
+
+    def __repr__(self):
+        return f"Name({self.id!r})"
+
+
+class UnaryOp(Node):
+    __slots__ = ("op", "operand")
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+    def __repr__(self):
+        return f"UnaryOp({self.op!r}, {self.operand!r})"
+
+
+class BinOp(Node):
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def __repr__(self):
+        return f"BinOp({self.op!r}, {self.left!r}, {self.right!r})"
+
+
+class Call(Node):
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def __repr__(self):
+        return f"Call({self.func!r}, {self.args!r})"
+
+
+# --- Pratt parser ---
+
+# left binding powers of infix/postfix operators
+_INFIX_BP = {"+": 10, "-": 10, "*": 20, "/": 20, "//": 20, "%": 20, "**": 40, "!": 50}
+# prefix signs bind tighter than * but looser than **, so -2**2 == -(2**2)
+_PREFIX_BP = 30
+
+
+class Parser:
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def advance(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, value):
+        tok = self.advance()
+        if tok.kind != "op" or tok.value != value:
+            raise SyntaxError(f"expected {value!r}")
+        return tok
+
+    def parse(self):
+        node = self.expression(0)
+        if self.peek().kind != "end":
+            raise SyntaxError("unexpected input after expression")
+        return node
+
+    def expression(self, rbp: int):
+        left = self.prefix(self.advance())
+        while True:
+            tok = self.peek()
+            if tok.kind != "op" or _INFIX_BP.get(tok.value, 0) <= rbp:
+                return left
+            self.advance()
+            if tok.value == "!":
+                left = Call("fact", [left])
+            elif tok.value == "**":
+                # right associative
+                left = BinOp("**", left, self.expression(_INFIX_BP["**"] - 1))
+            else:
+                left = BinOp(tok.value, left, self.expression(_INFIX_BP[tok.value]))
+
+    def prefix(self, tok):
+        if tok.kind == "num":
+            return Num(tok.value)
+        if tok.kind == "name":
+            if self.peek().kind == "op" and self.peek().value == "(":
+                self.advance()
+                return Call(tok.value, self.arguments())
+            return Name(tok.value)
+        if tok.kind == "op":
+            if tok.value in UNARY_OPS:
+                return UnaryOp(tok.value, self.expression(_PREFIX_BP))
+            if tok.value == "(":
+                node = self.expression(0)
+                self.expect(")")
+                return node
+        raise SyntaxError("unexpected end of expression" if tok.kind == "end" else f"unexpected {tok.value!r}")
+
+    def arguments(self):
+        args = []
+        if self.peek().kind == "op" and self.peek().value == ")":
+            self.advance()
+            return args
+        while True:
+            args.append(self.expression(0))
+            tok = self.advance()
+            if tok.kind == "op" and tok.value == ")":
+                return args
+            if tok.kind != "op" or tok.value != ",":
+                raise SyntaxError("expected ',' or ')'")
+
+
+def parse(text: str):
+    """Parse expression text into an AST."""
+    return Parser(text).parse()
+
+
+def unparse(node):
+    """Render an AST back to text in a canonical, fully parenthesized form.
+
+    Inputs that differ only in whitespace, redundant parentheses or ``^``
+    versus ``**`` unparse to the same string.
+    """
+    if isinstance(node, Num):
+        return repr(node.value)
+    if isinstance(node, Name):
+        return node.id
+    if isinstance(node, UnaryOp):
+        return f"({node.op}{unparse(node.operand)})"
+    if isinstance(node, BinOp):
+        return f"({unparse(node.left)}{node.op}{unparse(node.right)})"
+    if isinstance(node, Call):
+        return f"{node.func}({','.join(unparse(a) for a in node.args)})"
+    raise TypeError(f"cannot unparse {node!r}")
+
+
+# --- closure compiler ---
+
+def _missing(name):
+    def lookup(env):
+        try:
+            return env[name]
+        except (KeyError, TypeError):
+            raise NameError(f"name '{name}' is not defined") from None
+    return lookup
+
+
+def compile_node(node, functions=None, constants=None, number=None, binary_ops=None):
+    """Compile an AST node into a closure taking a variable mapping.
+
+    ``number`` optionally converts literals (e.g. to Decimal) at compile time
+    and ``binary_ops`` overrides operator implementations.
+    """
+    functions = FUNCTIONS if functions is None else functions
+    constants = CONSTANTS if constants is None else constants
+    binary_ops = BINARY_OPS if binary_ops is None else binary_ops
+
+    if isinstance(node, Num):
+        value = node.value if number is None else number(node.value)
+        return lambda env: value
+    if isinstance(node, Name):
+        if node.id in constants:
+            value = constants[node.id]
+            return lambda env: value
+        return _missing(node.id)
+    if isinstance(node, UnaryOp):
+        op = UNARY_OPS[node.op]
+        operand = compile_node(node.operand, functions, constants, number, binary_ops)
+        return lambda env: op(operand(env))
+    if isinstance(node, BinOp):
+        op = binary_ops[node.op]
+        left = compile_node(node.left, functions, constants, number, binary_ops)
+        right = compile_node(node.right, functions, constants, number, binary_ops)
+        return lambda env: op(left(env), right(env))
+    if isinstance(node, Call):
+        fn = functions.get(node.func)
+        args = [compile_node(a, functions, constants, number, binary_ops) for a in node.args]
+        if fn is None:
+            # not a known function: look it up in the variables at call time
+            lookup = _missing(node.func)
+            return lambda env: lookup(env)(*[a(env) for a in args])
+        if len(args) == 1:
+            arg = args[0]
+            return lambda env: fn(arg(env))
+        return lambda env: fn(*[a(env) for a in args])
+    raise TypeError(f"cannot compile {node!r}")
+
+
+class CompiledExpression:
+    """A parsed and compiled expression that can be evaluated repeatedly."""
+
+    __slots__ = ("source", "tree", "_fn")
+
+    def __init__(self, source: str, tree, fn):
+        self.source = source
+        self.tree = tree
+        self._fn = fn
+
+    def __call__(self, env=None):
+        return self._fn(env if env is not None else {})
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+def compile_expression(text: str):
+    tree = parse(text)
+    return CompiledExpression(text, tree, compile_node(tree))
+
+
+def evaluate(text: str, env=None):
+    """Parse, compile and evaluate text in one go."""
+    return compile_expression(text)(env)
@@ -0,0 +1,270 @@
+"""Optimizing compile pass over parsed expressions.
+
+Before an expression is compiled, constant subtrees are folded, integer
+identities are simplified and repeated pure subexpressions are computed
+once into temporaries. compile_optimized() caches the result per source
+text, so evaluating it again with new variable values only runs the
+residual tree; the rewrites applied are kept on ``rewrites``.
+"""
+import logging
+from collections import Counter
+from functools import lru_cache
+
+from expression_engine import (
+    Num, Name, UnaryOp, BinOp, Call, BINARY_OPS, UNARY_OPS,
+    FUNCTIONS, CONSTANTS, PYTHON_FUNCTIONS, PYTHON_CONSTANTS,
+    parse, unparse, compile_node,
+)
+from expression_cost import CostEstimator, DEFAULT_BUDGET
+from metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+# (pure functions, constants) per dialect; anything else is looked up at run time
+DIALECTS = {
+    "calculator": (FUNCTIONS, CONSTANTS),
+    "python": (PYTHON_FUNCTIONS, PYTHON_CONSTANTS),
+}
+
+
+# widest int folded into a literal
+_MAX_FOLD_BITS = 4096
+
+
+def _is_int(node, value):
+    return isinstance(node, Num) and type(node.value) is int and node.value == value
+
+
+class Optimizer:
+    """Constant folding, identity simplification and common-subexpression
+    elimination over expression ASTs.
+
+    Identities are only applied with integer constants (``x+0``, ``x*1``,
+    ``x**1``, ``--x``) so int/float result types are preserved, and only
+    with ``identities`` on: in Python a variable may hold a string or list,
+    for which ``s+0`` must still raise. Calls to functions outside the
+    dialect's pure table are never folded or shared. Every rewrite applied
+    is appended to ``rewrites``.
+    """
+
+    def __init__(self, functions=None, constants=None, identities: bool = True):
+        self.functions = FUNCTIONS if functions is None else functions
+        self.constants = CONSTANTS if constants is None else constants
+        self.identities = identities
+        self.rewrites = []
+        self._folded = {}
+
+    def optimize(self, tree):
+        """Return (tree, temps): temps are (name, subtree) pairs the tree refers to."""
+        tree = self.fold(tree)
+        return self.eliminate(tree)
+
+    def fold(self, node):
+        if isinstance(node, Num):
+            return node
+        if isinstance(node, Name):
+            if node.id in self.constants:
+                return Num(self.constants[node.id])
+            return node
+        if isinstance(node, UnaryOp):
+            operand = self.fold(node.operand)
+            new = UnaryOp(node.op, operand)
+            if isinstance(operand, Num):
+                return self._fold_constant(new, lambda: UNARY_OPS[node.op](operand.value))
+            if node.op == "+":
+                return self._identity(new, operand)
+            if node.op == "-" and isinstance(operand, UnaryOp) and operand.op == "-":
+                return self._identity(new, operand.operand)
+            return new
+        if isinstance(node, BinOp):
+            left = self.fold(node.left)
+            right = self.fold(node.right)
+            new = BinOp(node.op, left, right)
+            if isinstance(left, Num) and isinstance(right, Num):
+                return self._fold_constant(new, lambda: BINARY_OPS[node.op](left.value, right.value))
+            if node.op == "+" and _is_int(right, 0) or node.op in ("*", "**") and _is_int(right, 1):
+                return self._identity(new, left)
+            if node.op == "+" and _is_int(left, 0) or node.op == "*" and _is_int(left, 1):
+                return self._identity(new, right)
+            if node.op == "-" and _is_int(right, 0):
+                return self._identity(new, left)
+            return new
+        if isinstance(node, Call):
+            args = [self.fold(a) for a in node.args]
+            new = Call(node.func, args)
+            fn = self.functions.get(node.func)
+            if fn is not None and all(isinstance(a, Num) for a in args):
+                return self._fold_constant(new, lambda: fn(*[a.value for a in args]))
+            return new
+        return node
+
+    def _fold_constant(self, node, compute):
+        key = unparse(node)
+        if key not in self._folded:
+            try:
+                self._folded[key] = compute()
+            except Exception:
+                # leave it for run time so the error surfaces as it would have
+                self._folded[key] = node
+        value = self._folded[key]
+        if value is node or not isinstance(value, (int, float, complex)):
+            return node
+        if type(value) is int and value.bit_length() > _MAX_FOLD_BITS:
+            # keep huge literals out of the tree (and its canonical text)
+            return node
+        self.rewrites.append(f"fold {key} -> {value!r}")
+        return Num(value)
+
+    def _identity(self, node, replacement):
+        if not self.identities:
+            return node
+        self.rewrites.append(f"simplify {unparse(node)} -> {unparse(replacement)}")
+        return replacement
+
+    def eliminate(self, tree):
+        keys = {}
+        counts = Counter()
+        self._count(tree, keys, counts)
+        common = {key for key, n in counts.items() if n > 1}
+        if not common:
+            return tree, []
+
+        temps = []
+        names = {}
+
+        def rebuild(node):
+            if isinstance(node, (Num, Name)):
+                return node
+            if isinstance(node, UnaryOp):
+                new = UnaryOp(node.op, rebuild(node.operand))
+            elif isinstance(node, BinOp):
+                new = BinOp(node.op, rebuild(node.left), rebuild(node.right))
+            else:
+                new = Call(node.func, [rebuild(a) for a in node.args])
+            key = keys.get(id(node))
+            if key not in common:
+                return new
+            if key not in names:
+                names[key] = f"$t{len(temps)}"
+                temps.append((names[key], new))
+                self.rewrites.append(f"share {key} x{counts[key]} -> {names[key]}")
+            return Name(names[key])
+
+        return rebuild(tree), temps
+
+    def _count(self, node, keys, counts):
+        """Count pure compound subtrees by canonical text; return purity."""
+        if isinstance(node, Num):
+            return True
+        if isinstance(node, Name):
+            return True
+        if isinstance(node, UnaryOp):
+            pure = self._count(node.operand, keys, counts)
+        elif isinstance(node, BinOp):
+            pure = self._count(node.left, keys, counts) & self._count(node.right, keys, counts)
+        elif isinstance(node, Call):
+            pure = node.func in self.functions
+            for a in node.args:
+                pure &= self._count(a, keys, counts)
+        else:
+            return False
+        if pure:
+            key = unparse(node)
+            keys[id(node)] = key
+            counts[key] += 1
+        return pure
+
+
+class _TempFailed(Exception):
+    """Carries a temporary's own error past the name lookup that asked for it."""
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+class _TempScope(dict):
+    """Shared subexpression values, in front of the caller's variables.
+
+    A temporary is computed the first time the tree reads it, so
+    evaluation keeps its left-to-right order and the first error raised
+    is the one the unoptimized expression would have raised.
+    """
+
+    __slots__ = ("env", "temp_fns")
+
+    def __init__(self, env, temp_fns):
+        super().__init__()
+        self.env = env
+        self.temp_fns = temp_fns
+
+    def __missing__(self, name):
+        fn = self.temp_fns.get(name)
+        if fn is None:
+            return self.env[name]
+        try:
+            value = self[name] = fn(self)
+        except (KeyError, TypeError) as exc:
+            # the lookup would report these as an undefined "$tN"
+            raise _TempFailed(exc) from None
+        return value
+
+
+class OptimizedExpression:
+    """A compiled expression whose constant work has already been done.
+
+    Calling it with variable bindings only evaluates the residual tree,
+    computing each shared subexpression once, where it first occurs:
+
+    >>> compile_optimized("1/0 + sqrt(-1) + sqrt(-1)")()
+    Traceback (most recent call last):
+    ZeroDivisionError: division by zero
+    """
+
+    __slots__ = ("source", "key", "tree", "temps", "rewrites", "_fn", "_temp_fns")
+
+    def __init__(self, source, key, tree, temps, rewrites, functions, constants):
+        self.source = source
+        self.key = key
+        self.tree = tree
+        self.temps = temps
+        self.rewrites = rewrites
+        self._fn = compile_node(tree, functions, constants)
+        self._temp_fns = {name: compile_node(sub, functions, constants) for name, sub in temps}
+
+    @property
+    def constant(self):
+        return isinstance(self.tree, Num) and not self.temps
+
+    def __call__(self, env=None):
+        if not self._temp_fns:
+            return self._fn(env if env is not None else {})
+        # env may be a large namespace (or any mapping): look through it, don't copy it
+        scope = _TempScope(env if env is not None else {}, self._temp_fns)
+        try:
+            return self._fn(scope)
+        except _TempFailed as exc:
+            raise exc.error
+
+    def __repr__(self):
+        return f"OptimizedExpression({self.source!r}, {unparse(self.tree)!r})"
+
+
+@lru_cache(maxsize=512)
+def compile_optimized(text: str, dialect: str = "calculator", budget: int = DEFAULT_BUDGET):
+    """Parse, optimize and compile text; results are cached per source text.
+
+    Raises ExpressionTooExpensive before any folding if the expression's
+    estimated result exceeds budget bits (pass None to skip the check).
+    """
+    functions, constants = DIALECTS[dialect]
+    # only cache misses get here, so this is the parse + optimize cost
+    with METRICS.time("eval.compile"):
+        original = parse(text)
+        if budget is not None:
+            CostEstimator(budget, functions, constants).check(original)
+        optimizer = Optimizer(functions, constants, identities=dialect != "python")
+        tree, temps = optimizer.optimize(original)
+    if optimizer.rewrites:
+        log.debug("Optimized %r: %s", text, "; ".join(optimizer.rewrites))
+    return OptimizedExpression(text, unparse(original), tree, temps, optimizer.rewrites, functions, constants)
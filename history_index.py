@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from lower-cased trigrams to history sequence numbers.
+
+    Every entry is identified by a monotonically increasing sequence number,
+    so results come back in insertion order. Queries shorter than three
+    characters fall back to a plain scan.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.texts = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, seq: int, text: str):
+        text = text.lower()
+        self.texts[seq] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(seq)
+
+    def remove(self, seq: int):
+        text = self.texts.pop(seq, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(seq)
+                if not posting:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.postings.clear()
+        self.texts.clear()
+
+    def search(self, query: str):
+        """Return the sorted sequence numbers of entries containing query."""
+        query = query.lower()
+        if not query:
+            return sorted(self.texts)
+        grams = trigrams(query)
+        if not grams:
+            return sorted(seq for seq, text in self.texts.items() if query in text)
+
+        postings = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        if len(query) > 3:
+            # trigrams can all match without the query occurring contiguously
+            texts = self.texts
+            candidates = [seq for seq in candidates if query in texts[seq]]
+        return sorted(candidates)
@@ -0,0 +1,143 @@
+import io
+import csv
+import gzip
+import json
+from itertools import islice
+
+from history_record import HistoryRecord
+
+FIELDS = ("timestamp", "mode", "expression", "result", "kind", "error", "duration", "precision")
+
+
+def chunked(iterable, size: int):
+    """Yield lists of up to size items from iterable."""
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def detect_format(path):
+    """Return ("jsonl" | "csv", compressed) from a file name."""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    return ("csv" if name.endswith(".csv") else "jsonl"), compressed
+
+
+def _open(path, mode: str, compressed: bool):
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _kind(result):
+    if result is None:
+        return "none"
+    if type(result) is int:
+        return "int"
+    if type(result) is float:
+        return "float"
+    return "text"
+
+
+def record_to_dict(record):
+    return {
+        "timestamp": record.timestamp,
+        "mode": record.mode,
+        "expression": record.expression,
+        "result": record.result,
+        "kind": _kind(record.result),
+        "error": record.error,
+        "duration": record.duration,
+        "precision": record.precision,
+    }
+
+
+def dict_to_record(data):
+    result = data.get("result")
+    kind = data.get("kind")
+    # CSV hands every field back as a string
+    if isinstance(result, str):
+        if kind == "int":
+            result = int(result)
+        elif kind == "float":
+            result = float(result)
+        elif kind == "none":
+            result = None
+    error = data.get("error")
+    if isinstance(error, str):
+        error = error.lower() in ("1", "true")
+    precision = data.get("precision")
+    return HistoryRecord(
+        data.get("mode") or "text",
+        str(data.get("expression", "")),
+        result,
+        error=bool(error),
+        timestamp=float(data["timestamp"]) if data.get("timestamp") not in (None, "") else None,
+        duration=float(data.get("duration") or 0.0),
+        precision=int(precision) if precision not in (None, "") else None,
+    )
+
+
+def export_history(records, path, chunk_size: int = 4096):
+    """Stream records to a (optionally gzip-compressed) JSON-lines or CSV file.
+
+    Records are consumed lazily and written chunk by chunk, so memory use
+    does not depend on how many there are. Returns the number written.
+    """
+    fmt, compressed = detect_format(path)
+    count = 0
+    with _open(path, "w", compressed) as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+        for chunk in chunked(records, chunk_size):
+            rows = [record_to_dict(r if isinstance(r, HistoryRecord) else HistoryRecord.from_text(str(r))) for r in chunk]
+            if writer is not None:
+                writer.writerows(rows)
+            else:
+                buf = io.StringIO()
+                for row in rows:
+                    buf.write(json.dumps(row, ensure_ascii=False))
+                    buf.write("\n")
+                f.write(buf.getvalue())
+            count += len(rows)
+    return count
+
+
+def import_history(path, chunk_size: int = 4096):
+    """Yield lists of HistoryRecords read lazily from an exported file.
+
+    Malformed lines are skipped. Plain strings (the old history format) are
+    accepted in JSON-lines files as free-text entries.
+    """
+    fmt, compressed = detect_format(path)
+    with _open(path, "r", compressed) as f:
+        if fmt == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (_parse_json_line(line) for line in f)
+        for chunk in chunked(rows, chunk_size):
+            records = []
+            for row in chunk:
+                try:
+                    if isinstance(row, str):
+                        records.append(HistoryRecord.from_text(row))
+                    elif isinstance(row, dict):
+                        records.append(dict_to_record(row))
+                except (ValueError, TypeError, KeyError):
+                    continue
+            if records:
+                yield records
+
+
+def _parse_json_line(line: str):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
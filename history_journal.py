@@ -0,0 +1,391 @@
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+import threading
+
+from history_record import HistoryRecord
+from metrics import METRICS
+
+MAGIC = b"CALCHST1"
+OFFSET = struct.Struct("<Q")
+FRAME = struct.Struct("<I")
+
+
+def _encode(entry):
+    if isinstance(entry, str):
+        entry = HistoryRecord.from_text(entry)
+    body = entry.pack()
+    return FRAME.pack(len(body)) + body
+
+
+def _decode(buf, start: int, end: int):
+    return HistoryRecord.unpack(buf, start + FRAME.size, end)
+
+
+def read_legacy(path):
+    """Read entries from a text history file (a JSON list or JSON lines)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.lstrip().startswith(b"["):
+        try:
+            legacy = json.loads(data.decode("utf-8"))
+        except ValueError:
+            legacy = []
+        return [e for e in legacy if isinstance(e, str)] if isinstance(legacy, list) else []
+    entries = []
+    for raw in data.split(b"\n"):
+        try:
+            entry = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            continue
+        if isinstance(entry, str):
+            entries.append(entry)
+    return entries
+
+
+class HistoryJournal:
+    """Append-only journal of length-prefixed binary history records.
+
+    A side file (``<path>.idx``) stores the byte offset of every record, so
+    the newest records can be loaded without parsing the whole journal and
+    older ones can be read back on demand through a memory map. Records are
+    addressed by sequence number: the first record present when the journal
+    was opened is 0, and sequence numbers never shift when old records are
+    dropped by a trim.
+    """
+
+    def __init__(self, path, max_entries: int = 20, compact_slack: int = None, legacy_path=None):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        # text history file from older versions, imported when path is missing
+        self.legacy_path = legacy_path
+        self.index_path = path + ".idx"
+        self.max_entries = max_entries
+        # how many stale lines may pile up before the journal is trimmed
+        self.compact_slack = compact_slack if compact_slack is not None else max(max_entries, 16)
+        self.line_count = 0
+        # records removed from the front since the journal was opened
+        self.dropped = 0
+        self._size = 0
+        self._data_map = None
+        self._index_map = None
+        self._mapped_count = 0
+        self._lock = threading.RLock()
+
+    def load(self, page_size: int = 256):
+        """Open the journal and return the newest page_size entries."""
+        with self._lock:
+            self._unmap()
+            self.line_count = 0
+            self.dropped = 0
+            legacy = None
+            if not os.path.exists(self.path):
+                legacy = self.legacy_path if self.legacy_path and os.path.exists(self.legacy_path) else None
+            else:
+                with open(self.path, "rb") as f:
+                    if f.read(len(MAGIC)) != MAGIC:
+                        # text history written by an older version
+                        legacy = self.path
+            if legacy is not None or not os.path.exists(self.path):
+                entries = read_legacy(legacy) if legacy else []
+                entries = [HistoryRecord.from_text(e) for e in entries[-self.max_entries:]]
+                self._write_files(entries)
+                self._remap()
+                return entries[-page_size:]
+
+            self._recover()
+            self._remap()
+            if self.needs_compaction():
+                self._trim(self.max_entries)
+            stop = self.dropped + self.line_count
+            return self.read_range(stop - page_size, stop)
+
+    def read_range(self, start: int, stop: int):
+        """Return the entries with sequence numbers in [start, stop)."""
+        with self._lock:
+            first = max(start, self.dropped) - self.dropped
+            last = min(stop - self.dropped, self.line_count)
+            if first >= last:
+                return []
+            if last > self._mapped_count:
+                # records appended since the journal was last mapped
+                self._remap()
+            offsets = [OFFSET.unpack_from(self._index_map, i * OFFSET.size)[0] for i in range(first, last)]
+            end = OFFSET.unpack_from(self._index_map, last * OFFSET.size)[0] if last < self.line_count else self._size
+            offsets.append(end)
+            entries = []
+            for i in range(len(offsets) - 1):
+                try:
+                    entries.append(_decode(self._data_map, offsets[i], offsets[i + 1]))
+                except (ValueError, struct.error):
+                    entries.append(HistoryRecord.from_text(""))
+            return entries
+
+    def append(self, entry: str):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            offsets = []
+            chunks = []
+            pos = self._size
+            for entry in entries:
+                raw = _encode(entry)
+                offsets.append(OFFSET.pack(pos))
+                chunks.append(raw)
+                pos += len(raw)
+            # data first, so the index never points past the end of the journal
+            with open(self.path, "ab") as f:
+                f.write(b"".join(chunks))
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(offsets))
+            self._size = pos
+            self.line_count += len(entries)
+
+    def needs_compaction(self):
+        return self.line_count > self.max_entries + self.compact_slack
+
+    def trim(self, keep: int):
+        """Drop the oldest records so that at most keep remain."""
+        with self._lock:
+            self._trim(keep)
+
+    def compact(self, entries):
+        """Rewrite the journal so it holds exactly the given entries."""
+        with self._lock:
+            self._unmap()
+            self.dropped += self.line_count
+            self._write_files(entries)
+            self._remap()
+            self.log.info("History journal compacted to %d entries", self.line_count)
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    def _trim(self, keep: int):
+        drop = self.line_count - max(0, keep)
+        if drop <= 0:
+            return
+        if self.line_count > self._mapped_count:
+            self._remap()
+        if keep <= 0:
+            cut = self._size
+        else:
+            cut = OFFSET.unpack_from(self._index_map, drop * OFFSET.size)[0]
+        shift = cut - len(MAGIC)
+        offsets = [OFFSET.unpack_from(self._index_map, i * OFFSET.size)[0] - shift
+                   for i in range(drop, self.line_count)]
+        with open(self.path, "rb") as f:
+            f.seek(cut)
+            data = MAGIC + f.read()
+
+        self._unmap()
+        self._replace(self.path, data)
+        self._replace(self.index_path, b"".join(OFFSET.pack(o) for o in offsets))
+        self._size = len(data)
+        self.line_count = len(offsets)
+        self.dropped += drop
+        self._remap()
+        self.log.info("History journal trimmed to %d entries", self.line_count)
+
+    def _recover(self):
+        """Bring the offset index in line with the journal after a crash."""
+        size = os.path.getsize(self.path)
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        count = index_size // OFFSET.size
+
+        with open(self.path, "r+b") as f:
+            # trust the index up to the last offset that lies inside the journal
+            scan_from = len(MAGIC)
+            if count and os.path.exists(self.index_path):
+                with open(self.index_path, "rb") as idx:
+                    while count:
+                        idx.seek((count - 1) * OFFSET.size)
+                        last = OFFSET.unpack(idx.read(OFFSET.size))[0]
+                        if last < size:
+                            scan_from = last
+                            count -= 1
+                            break
+                        count -= 1
+
+            # re-index whatever follows: usually just the newest record
+            f.seek(scan_from)
+            tail = f.read()
+            offsets = []
+            pos = 0
+            while pos + FRAME.size <= len(tail):
+                end = pos + FRAME.size + FRAME.unpack_from(tail, pos)[0]
+                if end > len(tail):
+                    break
+                offsets.append(scan_from + pos)
+                pos = end
+            pos += scan_from
+            if pos < size:
+                # torn record left behind by a crash mid-append
+                f.truncate(pos)
+            self._size = pos
+
+        with open(self.index_path, "r+b" if os.path.exists(self.index_path) else "wb") as idx:
+            idx.truncate(count * OFFSET.size)
+            idx.seek(0, os.SEEK_END)
+            idx.write(b"".join(OFFSET.pack(o) for o in offsets))
+        self.line_count = count + len(offsets)
+
+    def _write_files(self, entries):
+        offsets = []
+        chunks = [MAGIC]
+        pos = len(MAGIC)
+        for entry in entries:
+            raw = _encode(entry)
+            offsets.append(OFFSET.pack(pos))
+            chunks.append(raw)
+            pos += len(raw)
+        self._replace(self.path, b"".join(chunks))
+        self._replace(self.index_path, b"".join(offsets))
+        self._size = pos
+        self.line_count = len(entries)
+
+    def _replace(self, path, data: bytes):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _remap(self):
+        self._unmap()
+        if self._size == 0 or self.line_count == 0:
+            return
+        with open(self.path, "rb") as f:
+            self._data_map = mmap.mmap(f.fileno(), self._size, access=mmap.ACCESS_READ)
+        with open(self.index_path, "rb") as f:
+            self._index_map = mmap.mmap(f.fileno(), self.line_count * OFFSET.size, access=mmap.ACCESS_READ)
+        self._mapped_count = self.line_count
+
+    def _unmap(self):
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._data_map = None
+        self._index_map = None
+        self._mapped_count = 0
+
+
+class HistoryWriter:
+    """Background thread that coalesces journal writes away from the Tk thread.
+
+    Appends are batched and written at most every ``interval_ms`` or once
+    ``max_pending`` entries are queued. Trims (compaction or clear) are
+    applied in the order they were requested relative to the appends.
+    """
+
+    def __init__(self, journal, interval_ms: int = 250, max_pending: int = 32):
+        self.log = logging.getLogger(__name__)
+        self.journal = journal
+        self.interval = interval_ms / 1000.0
+        self.max_pending = max_pending
+        # lines the journal will hold once everything queued is written
+        self.line_count = journal.line_count
+
+        self._cond = threading.Condition()
+        self._ops = []
+        self._appends = 0
+        self._queued = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, entry: str):
+        with self._cond:
+            self._ops.append(("append", entry))
+            self._appends += 1
+            self._queued += 1
+            self.line_count += 1
+            if self._appends == 1 or self._appends >= self.max_pending:
+                self._cond.notify_all()
+
+    def append_many(self, entries):
+        with self._cond:
+            for entry in entries:
+                self._ops.append(("append", entry))
+            self._appends += len(entries)
+            self._queued += 1
+            self.line_count += len(entries)
+            self._cond.notify_all()
+
+    def trim(self, keep: int):
+        with self._cond:
+            self._ops.append(("trim", keep))
+            self._queued += 1
+            self.line_count = min(self.line_count, keep)
+            self._cond.notify_all()
+
+    def needs_compaction(self):
+        return self.line_count > self.journal.max_entries + self.journal.compact_slack
+
+    def flush(self, timeout: float = None):
+        """Block until everything queued so far has reached the disk."""
+        with self._cond:
+            target = self._queued
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written >= target or not self._thread.is_alive(), timeout)
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _urgent(self):
+        return (self._appends >= self.max_pending or self._closed or self._flush_requested
+                or len(self._ops) > self._appends)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ops or self._closed or self._flush_requested)
+                # debounce: give a burst a chance to coalesce into one write
+                deadline = time.monotonic() + self.interval
+                while not self._urgent():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                ops, self._ops = self._ops, []
+                self._appends = 0
+                target = self._queued
+                self._flush_requested = False
+                closing = self._closed
+
+            start = time.perf_counter()
+            try:
+                batch = []
+                for op, arg in ops:
+                    if op == "append":
+                        batch.append(arg)
+                        continue
+                    self.journal.append_many(batch)
+                    batch = []
+                    self.journal.trim(arg)
+                self.journal.append_many(batch)
+            except Exception:
+                self.log.exception("History write failed")
+            if ops:
+                METRICS.observe("history.write", time.perf_counter() - start)
+                METRICS.count("history.ops_written", len(ops))
+
+            with self._cond:
+                self._written = target
+                self._cond.notify_all()
+                if closing and not self._ops:
+                    return
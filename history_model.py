@@ -0,0 +1,99 @@
+from collections import deque, OrderedDict
+
+
+class HistoryModel:
+    """Window over the newest max_entries history entries.
+
+    Only the newest page loaded at startup and the entries added this
+    session are kept in memory; older rows are paged in from the journal
+    when something (usually the scrolled history view) asks for them.
+    Rows are addressed by position, and by sequence number through
+    ``first_seq`` (row ``i`` has sequence ``first_seq + i``).
+    """
+
+    def __init__(self, journal, max_entries: int = 20, page_size: int = 256, cached_pages: int = 8):
+        self.journal = journal
+        self.max_entries = max_entries
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.first_seq = 0
+        # entries with sequence >= recent_seq are held in memory
+        self.recent_seq = 0
+        self.recent = deque()
+        self._pages = OrderedDict()
+
+    def load(self):
+        tail = self.journal.load(self.page_size)
+        count = self.journal.dropped + self.journal.line_count
+        self.first_seq = max(self.journal.dropped, count - self.max_entries)
+        self.recent = deque(tail[-self.max_entries:])
+        self.recent_seq = count - len(self.recent)
+        self._pages.clear()
+
+    @property
+    def next_seq(self):
+        return self.recent_seq + len(self.recent)
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def __getitem__(self, i: int):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("history index out of range")
+        seq = self.first_seq + i
+        if seq >= self.recent_seq:
+            return self.recent[seq - self.recent_seq]
+        return self._older(seq)
+
+    def __iter__(self):
+        return self.snapshot()
+
+    def snapshot(self):
+        """Iterate over the current rows, page by page.
+
+        The window is captured up front, so the generator can be consumed on
+        another thread while new entries keep arriving.
+        """
+        # not a generator itself: the window must be read here, not on first next()
+        return self._window(self.first_seq, self.recent_seq, list(self.recent))
+
+    def _window(self, first, stop, recent):
+        for seq in range(first, stop, self.page_size):
+            yield from self.journal.read_range(seq, min(seq + self.page_size, stop))
+        yield from recent
+
+    def append(self, entry: str):
+        """Add an entry; return the sequence number it pushed out, if any."""
+        self.recent.append(entry)
+        if len(self) <= self.max_entries:
+            return None
+        dropped = self.first_seq
+        self.first_seq += 1
+        if self.first_seq > self.recent_seq:
+            self.recent.popleft()
+            self.recent_seq += 1
+        return dropped
+
+    def clear(self):
+        seq = self.next_seq
+        self.recent.clear()
+        self.first_seq = self.recent_seq = seq
+        self._pages.clear()
+
+    def _older(self, seq: int):
+        page = seq // self.page_size
+        cached = self._pages.get(page)
+        if cached is None:
+            start = max(page * self.page_size, self.first_seq)
+            stop = min((page + 1) * self.page_size, self.recent_seq)
+            cached = (start, self.journal.read_range(start, stop))
+            self._pages[page] = cached
+            while len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page)
+        start, rows = cached
+        return rows[seq - start]
@@ -0,0 +1,110 @@
+import time
+import struct
+
+MODES = ("text", "standard", "scientific", "programmable", "area")
+_MODE_CODES = {name: code for code, name in enumerate(MODES)}
+
+# result kinds in the binary encoding
+_NONE, _INT, _FLOAT, _TEXT = range(4)
+_NO_PRECISION = 255
+
+# timestamp, duration, mode, error flag, result kind, precision, expression length
+_HEADER = struct.Struct("<dfBBBBI")
+_INT64 = struct.Struct("<q")
+_FLOAT64 = struct.Struct("<d")
+
+
+def format_result(result, precision=None):
+    """Format a raw result the way the calculators display it."""
+    if isinstance(result, float) and precision is not None:
+        return f"{result:.{precision}f}"
+    return str(result)
+
+
+class HistoryRecord:
+    """One calculation in the history, kept in raw form until it is rendered.
+
+    ``result`` is the raw int/float result, the error message when ``error``
+    is set, or None for statements that produce no value. Any other result
+    is stored as its ``str()``.
+    """
+
+    __slots__ = ("mode", "expression", "result", "error", "timestamp", "duration", "precision")
+
+    def __init__(self, mode: str, expression: str, result=None, error: bool = False,
+                 timestamp: float = None, duration: float = 0.0, precision: int = None):
+        if result is not None and (type(result) not in (int, float) or error):
+            result = str(result)
+        self.mode = mode if mode in _MODE_CODES else "text"
+        self.expression = expression
+        self.result = result
+        self.error = bool(error)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.duration = duration
+        self.precision = precision
+
+    @classmethod
+    def from_text(cls, text: str):
+        """Wrap a free-text entry (e.g. from an old history file)."""
+        return cls("text", text)
+
+    def text(self):
+        if self.mode == "text":
+            return self.expression
+        if self.error:
+            return f"{self.expression} -> {self.result}"
+        if self.result is None:
+            return f"{self.expression} -> OK"
+        value = format_result(self.result, self.precision)
+        if self.mode == "area":
+            return f"{self.expression} -> Area: {value}"
+        return f"{self.expression} = {value}"
+
+    __str__ = text
+
+    def __repr__(self):
+        return f"HistoryRecord({self.mode!r}, {self.expression!r}, {self.result!r}, error={self.error})"
+
+    def pack(self):
+        expression = self.expression.encode("utf-8")
+        result = self.result
+        if result is None:
+            kind, payload = _NONE, b""
+        elif type(result) is int and -2 ** 63 <= result < 2 ** 63:
+            kind, payload = _INT, _INT64.pack(result)
+        elif type(result) is float:
+            kind, payload = _FLOAT, _FLOAT64.pack(result)
+        else:
+            kind, payload = _TEXT, str(result).encode("utf-8")
+        precision = _NO_PRECISION if self.precision is None else self.precision
+        header = _HEADER.pack(self.timestamp, self.duration, _MODE_CODES[self.mode], self.error,
+                              kind, precision, len(expression))
+        return header + expression + payload
+
+    @classmethod
+    def unpack(cls, buf, offset: int = 0, end: int = None):
+        end = len(buf) if end is None else end
+        timestamp, duration, mode, error, kind, precision, length = _HEADER.unpack_from(buf, offset)
+        pos = offset + _HEADER.size
+        expression = bytes(buf[pos:pos + length]).decode("utf-8")
+        pos += length
+        if kind == _INT:
+            result = _INT64.unpack_from(buf, pos)[0]
+        elif kind == _FLOAT:
+            result = _FLOAT64.unpack_from(buf, pos)[0]
+        elif kind == _TEXT:
+            text = bytes(buf[pos:end]).decode("utf-8")
+            # integers too wide for int64 are stored as their digits
+            result = int(text) if not error and text.lstrip("-").isdigit() else text
+        else:
+            result = None
+
+        record = cls.__new__(cls)
+        record.mode = MODES[mode] if mode < len(MODES) else "text"
+        record.expression = expression
+        record.result = result
+        record.error = bool(error)
+        record.timestamp = timestamp
+        record.duration = duration
+        record.precision = None if precision == _NO_PRECISION else precision
+        return record
@@ -0,0 +1,249 @@
+"""Tk-free calculation history: storage, paging, search, import and export.
+
+CalculationHistory is a view over a HistorySession; headless tools can use
+one directly. The sqlite and export modules are imported only when used.
+"""
+import os
+import logging
+import threading
+from collections import deque
+
+from history_journal import HistoryJournal, HistoryWriter
+from history_index import TrigramIndex
+from history_model import HistoryModel
+from history_record import HistoryRecord
+from metrics import METRICS
+
+
+class HistorySession:
+    def __init__(self, history_file=None, max_entries: int = 20, legacy_file=None, backend: str = "journal"):
+        self.log = logging.getLogger(__name__)
+
+        self.max_entries = max_entries
+        # search index: built on a background thread after the first query,
+        # then kept up to date; until then queries scan the in-memory rows
+        self.index = None
+        self._index_thread = None
+        # (seq, text) added and (seq, None) dropped while the index is built
+        self._index_pending = None
+        self._index_lock = threading.Lock()
+        self.matches = None
+        self.query = ""
+        # callables run as listener(added) after entries are added or cleared
+        self.listeners = []
+        if history_file:
+            self.history_file = history_file
+        else:
+            default_name = "history.db" if backend == "sqlite" else "history.dat"
+            self.history_file = os.path.join(os.path.dirname(__file__), default_name)
+        if legacy_file is None:
+            legacy_file = os.path.join(os.path.dirname(self.history_file), "history.json")
+        # sqlite is safe to share between several running instances
+        journal_cls = HistoryJournal
+        if backend == "sqlite":
+            from history_sqlite import SQLiteHistoryJournal
+            journal_cls = SQLiteHistoryJournal
+        self.journal = journal_cls(self.history_file, max_entries=max_entries, legacy_path=legacy_file)
+        # only the newest page is read at startup; older rows are paged in on demand
+        self.entries = HistoryModel(self.journal, max_entries=max_entries)
+
+        # load existing
+        self._load()
+        # journal writes happen on a background thread, never in the caller
+        self.writer = HistoryWriter(self.journal)
+
+    def add_entry(self, entry):
+        """Add a HistoryRecord, or a free-text entry; return the record added."""
+        if not isinstance(entry, HistoryRecord):
+            text = str(entry).strip()
+            if not text:
+                return None
+            entry = HistoryRecord.from_text(text)
+        self.add_entries([entry])
+        self.log.info("History added: %s", entry)
+        return entry
+
+    @METRICS.timed("history.add")
+    def add_entries(self, records):
+        """Add HistoryRecords in bulk with a single write; return how many."""
+        records = list(records)
+        if not records:
+            return 0
+        with self._index_lock:
+            for entry in records:
+                seq = self.entries.next_seq
+                dropped = self.entries.append(entry)
+                if self.index is not None:
+                    if dropped is not None:
+                        self.index.remove(dropped)
+                    self.index.add(seq, entry.text())
+                elif self._index_pending is not None:
+                    if dropped is not None:
+                        self._index_pending.append((dropped, None))
+                    self._index_pending.append((seq, entry.text()))
+        if self.matches is not None:
+            self.matches = self._match(self.query)
+        try:
+            self.writer.append_many(records)
+            if self.writer.needs_compaction():
+                self._save()
+        except Exception:
+            pass
+        self._notify(len(records))
+        return len(records)
+
+    def clear(self):
+        with self._index_lock:
+            self.entries.clear()
+            # an empty history is fully indexed; a build still running is discarded
+            self.index = TrigramIndex()
+            self._index_thread = self._index_pending = None
+        if self.matches is not None:
+            self.matches = []
+        self._save()
+        self._notify(0)
+        self.log.info("History cleared")
+
+    def _notify(self, added: int):
+        for listener in list(self.listeners):
+            try:
+                listener(added)
+            except Exception:
+                self.log.exception("History listener failed")
+
+    def search(self, query: str):
+        """Restrict rows to entries containing query; empty query shows all.
+
+        Until the index is ready (see ``index_ready``) only the rows held in
+        memory are searched, so the first query never waits for the journal.
+        """
+        self.query = query = query.strip()
+        if not query:
+            self.matches = None
+        else:
+            if self.index is None:
+                self.build_index()
+            self.matches = self._match(query)
+        return self.matches
+
+    @property
+    def index_ready(self):
+        return self.index is not None
+
+    def _match(self, query: str):
+        index = self.index
+        if index is not None:
+            return index.search(query)
+        query = query.lower()
+        start = self.entries.recent_seq
+        return [seq for seq, entry in enumerate(list(self.entries.recent), start) if query in entry.text().lower()]
+
+    def build_index(self):
+        """Start building the search index on a background thread, if it isn't built or building."""
+        with self._index_lock:
+            if self.index is not None or self._index_thread is not None:
+                return
+            self._index_pending = []
+            first, records = self.entries.first_seq, self.entries.snapshot()
+            thread = self._index_thread = threading.Thread(
+                target=self._build_index, args=(first, records), name="history-index", daemon=True)
+        thread.start()
+
+    def _build_index(self, first, records):
+        index = TrigramIndex()
+        try:
+            with METRICS.time("history.index"):
+                for seq, entry in enumerate(records, first):
+                    index.add(seq, entry.text())
+        except Exception:
+            self.log.exception("Could not build the history search index")
+            index = None
+        with self._index_lock:
+            if self._index_thread is not threading.current_thread():
+                # cleared while building
+                return
+            self._index_thread = None
+            if index is not None:
+                for seq, text in self._index_pending:
+                    if text is None:
+                        index.remove(seq)
+                    else:
+                        index.add(seq, text)
+                self.index = index
+            self._index_pending = None
+
+    def row_count(self):
+        if self.matches is not None:
+            return len(self.matches)
+        return len(self.entries)
+
+    def row(self, i: int):
+        if self.matches is not None:
+            return self.entries[self.matches[i] - self.entries.first_seq].text()
+        return self.entries[i].text()
+
+    def text(self):
+        return "\n".join(entry.text() for entry in self.entries)
+
+    def export(self, path, background=True):
+        """Stream the history to a .jsonl/.csv file (optionally .gz)."""
+        from history_io import export_history  # gzip/csv only when exporting
+        records = self.entries.snapshot()
+
+        def work():
+            try:
+                count = export_history(records, path)
+                self.log.info("History exported: %d entries to %s", count, path)
+                return count
+            except Exception:
+                self.log.exception("History export failed")
+
+        if not background:
+            return work()
+        threading.Thread(target=work, name="history-export", daemon=True).start()
+
+    def read_import(self, path):
+        """Parse an exported history file; return (newest records, total read).
+
+        Only the newest max_entries records are kept while streaming, since
+        older ones would be trimmed straight away. Safe to call off-thread.
+        """
+        from history_io import import_history
+        window = deque(maxlen=self.max_entries)
+        count = 0
+        try:
+            for chunk in import_history(path):
+                window.extend(chunk)
+                count += len(chunk)
+        except Exception:
+            self.log.exception("History import failed")
+        return window, count
+
+    @METRICS.timed("history.save")
+    def _save(self):
+        # queue a trim of the journal down to the current window
+        try:
+            self.writer.trim(len(self.entries))
+        except Exception:
+            pass
+
+    def flush(self):
+        """Block until all pending history writes are on disk."""
+        try:
+            self.writer.flush()
+        except Exception:
+            pass
+
+    def close(self):
+        try:
+            self.writer.close()
+            self.journal.close()
+        except Exception:
+            pass
+
+    @METRICS.timed("history.load")
+    def _load(self):
+        try:
+            self.entries.load()
+        except Exception:
+            self.log.exception("Could not load history")
@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import logging
+import threading
+from array import array
+
+from history_journal import read_legacy
+from history_record import HistoryRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    mode TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    result,
+    error INTEGER NOT NULL DEFAULT 0,
+    duration REAL NOT NULL DEFAULT 0,
+    precision INTEGER
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+CREATE INDEX IF NOT EXISTS history_mode ON history(mode);
+"""
+
+_COLUMNS = "id, timestamp, mode, expression, result, error, duration, precision"
+
+
+def _row_to_record(row):
+    _, timestamp, mode, expression, result, error, duration, precision = row
+    if isinstance(result, str) and not error and result.lstrip("-").isdigit():
+        # integers too wide for SQLite are stored as their digits
+        result = int(result)
+    record = HistoryRecord(mode, expression, result, error=error, timestamp=timestamp,
+                           duration=duration, precision=precision)
+    return record
+
+
+def _record_to_row(record):
+    result = record.result
+    if type(result) is int and not -2 ** 63 <= result < 2 ** 63:
+        result = str(result)
+    return (record.timestamp, record.mode, record.expression, result, int(record.error),
+            record.duration, record.precision)
+
+
+class SQLiteHistoryJournal:
+    """History storage in a SQLite database in WAL mode.
+
+    Drop-in alternative to HistoryJournal for HistoryModel and HistoryWriter.
+    Several app instances can share one database: each insert is its own
+    row, so concurrent writers never overwrite each other, and WAL lets
+    readers page through history while another process writes.
+    """
+
+    def __init__(self, path, max_entries: int = 20, compact_slack: int = None, legacy_path=None):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self.legacy_path = legacy_path
+        self.max_entries = max_entries
+        self.compact_slack = compact_slack if compact_slack is not None else max(max_entries, 16)
+        self.line_count = 0
+        self.dropped = 0
+        # row ids of the window at load time; sequence n maps to _ids[n]
+        self._ids = array("q")
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def load(self, page_size: int = 256):
+        conn = self._connect()
+        created = not conn.execute("SELECT name FROM sqlite_master WHERE name = 'history'").fetchone()
+        with conn:
+            conn.executescript(SCHEMA)
+        if created and self.legacy_path and os.path.exists(self.legacy_path):
+            legacy = read_legacy(self.legacy_path)[-self.max_entries:]
+            self.append_many([HistoryRecord.from_text(e) for e in legacy])
+
+        rows = conn.execute("SELECT id FROM history ORDER BY id DESC LIMIT ?", (self.max_entries,)).fetchall()
+        self._ids = array("q", reversed([r[0] for r in rows]))
+        self.dropped = 0
+        self.line_count = len(self._ids)
+        return self.read_range(self.line_count - page_size, self.line_count)
+
+    def read_range(self, start: int, stop: int):
+        start = max(start, 0)
+        stop = min(stop, len(self._ids))
+        if start >= stop:
+            return []
+        ids = self._ids
+        rows = self._connect().execute(
+            f"SELECT {_COLUMNS} FROM history WHERE id BETWEEN ? AND ? ORDER BY id",
+            (ids[start], ids[stop - 1])).fetchall()
+        by_id = {row[0]: row for row in rows}
+        # rows trimmed away by another instance read back as blanks
+        return [_row_to_record(by_id[i]) if i in by_id else HistoryRecord.from_text("")
+                for i in ids[start:stop]]
+
+    def query(self, mode: str = None, since: float = None, until: float = None, limit: int = 100, offset: int = 0):
+        """Page through history newest first, filtered on the indexed columns."""
+        clauses = []
+        params = []
+        if mode is not None:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params += [limit, offset]
+        rows = self._connect().execute(
+            f"SELECT {_COLUMNS} FROM history {where} ORDER BY id DESC LIMIT ? OFFSET ?", params)
+        return [_row_to_record(row) for row in rows]
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        if not entries:
+            return
+        rows = [_record_to_row(e if isinstance(e, HistoryRecord) else HistoryRecord.from_text(e)) for e in entries]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO history (timestamp, mode, expression, result, error, duration, precision) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.line_count += len(rows)
+
+    def needs_compaction(self):
+        return self.line_count > self.max_entries + self.compact_slack
+
+    def trim(self, keep: int):
+        """Drop all but the newest keep rows, whichever instance wrote them."""
+        conn = self._connect()
+        with conn:
+            if keep <= 0:
+                conn.execute("DELETE FROM history")
+            else:
+                conn.execute(
+                    "DELETE FROM history WHERE id < "
+                    "(SELECT min(id) FROM (SELECT id FROM history ORDER BY id DESC LIMIT ?))", (keep,))
+        self.line_count = min(self.line_count, max(0, keep))
+
+    def compact(self, entries):
+        self.trim(0)
+        self.append_many(entries)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections = []
+        self._local = threading.local()
@@ -1,24 +1,33 @@
-import os
-import json
+import queue
 import logging
+import threading
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog
+
+from history_service import HistorySession
+from history_view import VirtualListView
 
 
 class CalculationHistory:
-    def __init__(self, master, history_file=None, max_entries: int = 20):
+    """Tk view over a HistorySession.
+
+    Pass session to show one that already exists (it may have been written
+    to before the view was built); otherwise the view opens its own.
+    """
+
+    def __init__(self, master, history_file=None, max_entries: int = 20, legacy_file=None, backend: str = "journal",
+                 session=None):
         self.log = logging.getLogger(__name__)
 
         self.master = master
-        self.entries = []
-        self.max_entries = max_entries
-        if history_file:
-            self.history_file = history_file
-        else:
-            self.history_file = os.path.join(os.path.dirname(__file__), "history.json")
-
-        # load existing
-        self._load()
+        if session is None:
+            session = HistorySession(history_file, max_entries=max_entries, legacy_file=legacy_file, backend=backend)
+        self.session = session
+        self.max_entries = session.max_entries
+        self.history_file = self.session.history_file
+        self.journal = self.session.journal
+        self.entries = self.session.entries
+        self.writer = self.session.writer
 
         self.frame = tk.Frame(master, bg="#f7f7f7")
         self.frame.pack(fill="both", expand=True)
@@ -36,22 +45,34 @@ class CalculationHistory:
         self.copy_btn = tk.Button(btn_frame, text="Copy", command=self.copy_to_clipboard, bg="#2ecc71", fg="white", bd=0)
         self.copy_btn.pack(side="right", padx=(0, 4))
 
+        self.import_btn = tk.Button(btn_frame, text="Import", command=self.import_file, bg="#2ecc71", fg="white", bd=0)
+        self.import_btn.pack(side="right", padx=(0, 4))
+
+        self.export_btn = tk.Button(btn_frame, text="Export", command=self.export_file, bg="#2ecc71", fg="white", bd=0)
+        self.export_btn.pack(side="right", padx=(0, 4))
+
+        search_frame = tk.Frame(self.frame, bg="#f7f7f7")
+        search_frame.pack(fill="x", padx=8, pady=(0, 8))
+        self.search_label = tk.Label(search_frame, text="Search:", font=("Arial", 10), bg="#f7f7f7")
+        self.search_label.pack(side="left", padx=(0, 4))
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(search_frame, textvariable=self.search_var, font=("Consolas", 11), bd=0)
+        self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_var.trace_add("write", lambda *args: self.search(self.search_var.get()))
+
         list_frame = tk.Frame(self.frame, bg="#f7f7f7")
         list_frame.pack(fill="both", expand=True, padx=8, pady=(0, 8))
 
-        self.scrollbar = tk.Scrollbar(list_frame)
-        self.scrollbar.pack(side="right", fill="y")
-
-        self.listbox = tk.Listbox(list_frame, yscrollcommand=self.scrollbar.set, font=("Consolas", 11))
-        self.listbox.pack(side="left", fill="both", expand=True)
-        self.scrollbar.config(command=self.listbox.yview)
+        # only the rows scrolled into view are ever inserted into the listbox
+        self.view = VirtualListView(list_frame, row_count=self.session.row_count, get_row=self.session.row)
+        self.view.pack(fill="both", expand=True)
+        self.listbox = self.view.listbox
+        self.scrollbar = self.view.scrollbar
         self.listbox.bind("<Double-1>", self._on_double_click)
-
-        for e in self.entries:
-            try:
-                self.listbox.insert(tk.END, e)
-            except Exception:
-                pass
+        self.view.see_end()
+        self._index_polling = False
+        # entries added from any tab (or the import poller) refresh the view
+        self.session.listeners.append(self._on_change)
 
     def apply_theme(self, theme: dict):
         try:
@@ -59,7 +80,8 @@ class CalculationHistory:
             fg = theme.get("fg", "#232b36")
             entry_bg = theme.get("entry_bg", "#ffffff")
             self.frame.configure(bg=bg)
-            for w in (self.listbox, self.scrollbar, self.clear_btn, self.copy_btn):
+            self.search_label.configure(bg=bg, fg=fg)
+            for w in (self.listbox, self.scrollbar, self.clear_btn, self.copy_btn, self.import_btn, self.export_btn, self.search_entry):
                 try:
                     w.configure(bg=entry_bg, fg=fg)
                 except Exception:
@@ -67,45 +89,88 @@ class CalculationHistory:
         except Exception:
             pass
 
-    def add_entry(self, text: str):
-        entry = text.strip()
-        if not entry:
-            return
-        self.entries.append(entry)
-        if len(self.entries) > self.max_entries:
-            try:
-                self.entries.pop(0)
-                self.listbox.delete(0)
-            except Exception:
-                pass
-        try:
-            self.listbox.insert(tk.END, entry)
-            self.listbox.see(tk.END)
-        except Exception:
-            pass
+    def add_entry(self, entry):
+        """Add a HistoryRecord, or a free-text entry, to the history."""
+        self.session.add_entry(entry)
+
+    def add_entries(self, records):
+        """Add HistoryRecords in bulk with a single view refresh and write."""
+        self.session.add_entries(records)
+
+    def clear(self):
+        self.session.clear()
+
+    def _on_change(self, added: int):
+        # stay pinned to the newest row if the view was showing it before the add
         try:
-            self._save()
-            self.log.info(f"History added: {entry}")
+            if self.view.top + self.view.visible >= self.session.row_count() - added:
+                self.view.see_end()
+            else:
+                self.view.refresh()
         except Exception:
             pass
 
-    def clear(self):
-        self.entries.clear()
-        self.listbox.delete(0, tk.END)
+    def search(self, query: str):
+        """Filter the history view down to entries containing query."""
+        matches = self.session.search(query)
         try:
-            self._save()
-            self.log.info("History cleared")
+            self.view.see_end()
         except Exception:
             pass
+        if matches is not None and not self.session.index_ready and not self._index_polling:
+            # only the newest rows were searched; search again once the index is built
+            self._index_polling = True
+            self.master.after(100, self._poll_index)
+        return matches
+
+    def _poll_index(self):
+        if not self.session.index_ready:
+            self.master.after(100, self._poll_index)
+            return
+        self._index_polling = False
+        if self.session.query:
+            self.search(self.session.query)
 
     def copy_to_clipboard(self):
         try:
-            all_text = "\n".join(self.entries)
             self.master.clipboard_clear()
-            self.master.clipboard_append(all_text)
+            self.master.clipboard_append(self.session.text())
         except Exception:
             pass
 
+    def export_file(self, path=None):
+        """Stream the history to a .jsonl/.csv file (optionally .gz) in the background."""
+        if path is None:
+            path = filedialog.asksaveasfilename(
+                parent=self.master, defaultextension=".jsonl.gz",
+                filetypes=[("Compressed JSON lines", "*.jsonl.gz"), ("Compressed CSV", "*.csv.gz"),
+                           ("JSON lines", "*.jsonl"), ("CSV", "*.csv")])
+        if not path:
+            return
+        self.session.export(path)
+
+    def import_file(self, path=None):
+        """Import an exported history file without blocking the UI."""
+        if path is None:
+            path = filedialog.askopenfilename(
+                parent=self.master,
+                filetypes=[("History export", "*.jsonl.gz *.csv.gz *.jsonl *.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        done = queue.Queue()
+        threading.Thread(target=lambda: done.put(self.session.read_import(path)),
+                         name="history-import", daemon=True).start()
+        self._poll_import(done, path)
+
+    def _poll_import(self, done, path):
+        try:
+            window, count = done.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self._poll_import, done, path)
+            return
+        self.add_entries(window)
+        self.log.info("History imported: %d entries from %s", count, path)
+
     def _on_double_click(self, event):
         try:
             idx = self.listbox.curselection()
@@ -118,23 +183,21 @@ class CalculationHistory:
             pass
 
     def _save(self):
-        try:
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.entries, f, indent=2)
-        except Exception:
-            pass
+        self.session._save()
 
     def _load(self):
+        self.session._load()
+
+    def flush(self):
+        """Block until all pending history writes are on disk."""
+        self.session.flush()
+
+    def close(self):
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        self.entries = data[-self.max_entries:]
-                    else:
-                        self.entries = []
-        except Exception:
-            self.entries = []
+            self.session.listeners.remove(self._on_change)
+        except ValueError:
+            pass
+        self.session.close()
 
     def get_frame(self):
         return self.frame
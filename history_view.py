@@ -0,0 +1,80 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+
+class VirtualListView:
+    """Listbox that only holds the rows currently scrolled into view.
+
+    ``row_count()`` returns the total number of rows and ``get_row(i)`` the
+    text of row ``i``; the view asks for nothing outside the visible window,
+    so the cost of a refresh does not depend on how many rows there are.
+    """
+
+    def __init__(self, master, row_count, get_row, font=("Consolas", 11)):
+        self.row_count = row_count
+        self.get_row = get_row
+        self.top = 0
+        self.visible = 1
+
+        self.frame = tk.Frame(master, bg="#f7f7f7")
+        self.scrollbar = tk.Scrollbar(self.frame, command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.listbox = tk.Listbox(self.frame, font=font, activestyle="none")
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self._linespace = max(1, tkfont.Font(font=self.listbox.cget("font")).metrics("linespace"))
+
+        self.listbox.bind("<Configure>", self._on_configure)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_by(3))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def at_end(self):
+        return self.top + self.visible >= self.row_count()
+
+    def row_at(self, listbox_index: int):
+        """Map a listbox row to the absolute row it is showing."""
+        return self.top + listbox_index
+
+    def see_end(self):
+        self.top = max(0, self.row_count() - self.visible)
+        self.refresh()
+
+    def scroll_by(self, rows: int):
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    def refresh(self):
+        total = self.row_count()
+        self.top = max(0, min(self.top, total - self.visible))
+        stop = min(total, self.top + self.visible)
+        self.listbox.delete(0, tk.END)
+        for i in range(self.top, stop):
+            self.listbox.insert(tk.END, self.get_row(i))
+        if total:
+            self.scrollbar.set(self.top / total, stop / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_configure(self, event):
+        follow = self.at_end()
+        self.visible = max(1, event.height // self._linespace)
+        if follow:
+            self.see_end()
+        else:
+            self.refresh()
+
+    def _on_wheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_scroll(self, action, *args):
+        if action == "moveto":
+            self.top = int(float(args[0]) * self.row_count())
+        elif action == "scroll":
+            step = int(args[0])
+            self.top += step * self.visible if args[1] == "pages" else step
+        self.refresh()
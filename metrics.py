@@ -0,0 +1,184 @@
+"""Process-wide counters and latency histograms for the hot paths.
+
+    from metrics import METRICS
+    with METRICS.time("history.save"):
+        ...
+    METRICS.count("eval.cache_miss")
+
+Recording is off until ``METRICS.enabled`` is set (the ``metrics_enabled``
+setting); while it is off ``time()`` hands back a shared no-op timer and
+``count()`` returns straight away, so instrumented code pays one attribute
+check. Latencies go into log-spaced buckets (about 9% wide), which keeps
+recording O(1) and memory fixed while still giving usable p50/p99.
+"""
+import json
+import math
+import time
+import functools
+import threading
+
+# bucket i holds latencies in [MIN_SECONDS * GROWTH**i, MIN_SECONDS * GROWTH**(i+1))
+MIN_SECONDS = 1e-7
+STEPS_PER_DOUBLING = 8
+GROWTH = 2 ** (1 / STEPS_PER_DOUBLING)
+BUCKETS = 256
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        i = int(math.log2(seconds / MIN_SECONDS) * STEPS_PER_DOUBLING) if seconds > MIN_SECONDS else 0
+        self.counts[i if i < BUCKETS else BUCKETS - 1] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float):
+        """Approximate p-th percentile (0-100): the midpoint of its bucket, clamped to min/max."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                mid = MIN_SECONDS * GROWTH ** (i + 0.5)
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def time(self, name: str):
+        """Context manager recording the latency of its block under name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name: str):
+        """Decorator form of time()."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Counters and latency summaries (seconds) as plain JSON-able dicts."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "since": self.started,
+                "counters": dict(sorted(self._counters.items())),
+                "latency": {name: hist.summary() for name, hist in sorted(self._histograms.items())},
+            }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def report(self):
+        """The snapshot as a fixed-width text table."""
+        snap = self.snapshot()
+
+        def ms(seconds):
+            return "-" if seconds is None else f"{seconds * 1000:.3f}"
+
+        lines = [f"{'operation':28} {'count':>8} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}"]
+        for name, s in snap["latency"].items():
+            lines.append(f"{name:28} {s['count']:>8} {ms(s['p50']):>10} {ms(s['p99']):>10} {ms(s['max']):>10}")
+        if snap["counters"]:
+            lines.append("")
+            lines.extend(f"{name:28} {value:>8}" for name, value in snap["counters"].items())
+        if not snap["enabled"]:
+            lines.append("")
+            lines.append("(recording is off)")
+        return "\n".join(lines)
+
+
+# shared by the whole process
+METRICS = Metrics()
@@ -0,0 +1,340 @@
+"""Arbitrary-precision evaluation for the Standard and Scientific tabs.
+
+``decimal`` mode evaluates in Decimal with a context sized from the
+decimal_precision setting, so ``0.1+0.2`` is exactly ``0.3`` at any
+displayed precision. ``fraction`` mode keeps exact rationals until a
+transcendental function forces a float. Int literals stay ints (so
+integer-only functions such as ``math.comb`` still accept them); only
+float literals, ``/`` and negative powers produce Decimals or Fractions.
+
+Expressions whose native result is already exact are left to the native
+engine: those that only combine integers, and those whose float literals
+and ``+ - *`` (or division by a power of two) provably never round.
+``float`` mode is the native engine throughout.
+"""
+import math
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+
+from expression_engine import Num, UnaryOp, BinOp, Call, FUNCTIONS, CONSTANTS, BINARY_OPS, parse, compile_node
+from expression_cost import CostEstimator, DEFAULT_BUDGET, int_bits, pow2
+
+PRECISION_MODES = ("float", "decimal", "fraction")
+# significant digits carried beyond the displayed decimal places
+GUARD_DIGITS = 20
+# significand bits of a float
+_FLOAT_MANTISSA = 53
+_LOG2_10 = math.log2(10)
+
+_PI = "3.14159265358979323846264338327950288419716939937510582097494459"
+_E = "2.71828182845904523536028747135266249775724709369995957496696763"
+
+# functions whose results stay integers when their arguments are
+_INTEGRAL_FUNCTIONS = {"abs", "min", "max", "fact", "math.factorial", "math.comb",
+                       "math.perm", "math.gcd", "math.lcm", "math.isqrt"}
+
+
+def _to_decimal(value):
+    # repr gives the literal as typed (0.1 -> "0.1"), not its binary expansion
+    return Decimal(repr(value)) if isinstance(value, float) else value
+
+
+def _to_fraction(value):
+    if isinstance(value, float) and math.isfinite(value):
+        return Fraction(repr(value))
+    return value
+
+
+def _int_to_decimal(n):
+    """Decimal(n) to the current context's precision.
+
+    Decimal(n) converts every digit, which takes seconds for a
+    million-bit int; only the leading bits matter once it is rounded.
+    """
+    keep = int(decimal.getcontext().prec * _LOG2_10) + 64
+    shift = n.bit_length() - keep
+    if shift <= 0:
+        return Decimal(n)
+    return Decimal(n >> shift) * Decimal(2) ** shift
+
+
+def _decimal_op(op):
+    # an int meeting a Decimal would otherwise be converted in full
+    def apply(a, b):
+        if isinstance(a, int) and isinstance(b, Decimal):
+            a = _int_to_decimal(a)
+        elif isinstance(b, int) and isinstance(a, Decimal):
+            b = _int_to_decimal(b)
+        return op(a, b)
+    return apply
+
+
+def _via_float(fn):
+    """Run a float function on Decimal arguments and convert the result back."""
+    def call(*args):
+        result = fn(*[float(a) if isinstance(a, Decimal) else a for a in args])
+        return _to_decimal(result) if isinstance(result, float) else result
+    return call
+
+
+def _dsqrt(x):
+    if x < 0:
+        raise ValueError("negative")
+    return Decimal(x).sqrt()
+
+
+def _dln(x):
+    if x <= 0:
+        raise ValueError("non-positive")
+    return Decimal(x).ln()
+
+
+def _dlog(x):
+    if x <= 0:
+        raise ValueError("non-positive")
+    return Decimal(x).log10()
+
+
+def _dexp(x):
+    return Decimal(x).exp()
+
+
+def _ddiv(a, b):
+    # int / int would round to a float
+    if isinstance(a, int) and isinstance(b, int):
+        return _int_to_decimal(a) / _int_to_decimal(b)
+    return a / b
+
+
+def _dpow(a, b):
+    # the exponent stays an int: Decimal raises to integral powers exactly
+    if isinstance(a, int) and (isinstance(b, Decimal) or b < 0):
+        a = _int_to_decimal(a)
+    return a ** b
+
+
+def _dfloordiv(a, b):
+    if not isinstance(a, Decimal) and not isinstance(b, Decimal):
+        return a // b
+    # Decimal // truncates toward zero; Python floors
+    q = a // b
+    if (a % b) and (a < 0) != (b < 0):
+        q -= 1
+    return q
+
+
+def _dmod(a, b):
+    r = a % b
+    if r and (r < 0) != (b < 0):
+        r += b
+    return r
+
+
+def _fdiv(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return Fraction(a, b)
+    return a / b
+
+
+def _fpow(a, b):
+    if isinstance(a, int) and isinstance(b, int) and b < 0:
+        return Fraction(a) ** b
+    return a ** b
+
+
+def _ffact(x):
+    if isinstance(x, Fraction):
+        if x.denominator != 1:
+            raise ValueError("non-integer")
+        x = x.numerator
+    return FUNCTIONS["fact"](x)
+
+
+DECIMAL_FUNCTIONS = {name: _via_float(fn) for name, fn in FUNCTIONS.items()}
+DECIMAL_FUNCTIONS.update({
+    "abs": abs, "min": min, "max": max, "round": round,
+    "sqrt": _dsqrt, "ln": _dln, "log": _dlog,
+    "math.sqrt": _dsqrt, "math.log10": _dlog, "math.exp": _dexp,
+})
+DECIMAL_OPS = {name: _decimal_op(op) for name, op in BINARY_OPS.items()}
+DECIMAL_OPS.update({"/": _decimal_op(_ddiv), "**": _dpow,
+                    "//": _decimal_op(_dfloordiv), "%": _decimal_op(_dmod)})
+DECIMAL_CONSTANTS = {"pi": Decimal(_PI), "e": Decimal(_E), "math.pi": Decimal(_PI), "math.e": Decimal(_E),
+                     "math.tau": 2 * Decimal(_PI), "math.inf": Decimal("Infinity"), "math.nan": Decimal("NaN")}
+
+FRACTION_FUNCTIONS = dict(FUNCTIONS, fact=_ffact)
+FRACTION_FUNCTIONS["math.factorial"] = _ffact
+FRACTION_OPS = dict(BINARY_OPS)
+FRACTION_OPS.update({"/": _fdiv, "**": _fpow})
+
+
+class FractionCostEstimator(CostEstimator):
+    """CostEstimator for fraction mode, where ``/`` and float literals stay exact.
+
+    A Fraction's bits are its numerator's plus its denominator's, so
+    ``(1/3)**(10**8)`` is judged like any other big power instead of as a
+    float that would overflow.
+    """
+
+    def _estimate(self, node):
+        if isinstance(node, Num) and isinstance(node.value, float) and math.isfinite(node.value):
+            value = _to_fraction(node.value)
+            return "fraction", int_bits(value.numerator) + int_bits(value.denominator)
+        return super()._estimate(node)
+
+    def _combine(self, node, lkind, lbits, rkind, rbits):
+        op = node.op
+        if "float" in (lkind, rkind) or (lkind == rkind == "int" and op not in ("/", "**")):
+            return super()._combine(node, lkind, lbits, rkind, rbits)
+        if op == "**":
+            # a negative exponent only swaps numerator and denominator
+            if lbits == 0:
+                return lkind, 0.0
+            return ("int" if lkind == rkind == "int" else "fraction"), lbits * pow2(rbits)
+        if op in ("+", "-", "%"):
+            return "fraction", lbits + rbits + 1
+        if op == "//":
+            return "int", lbits + rbits
+        if op in ("*", "/"):
+            return "fraction", lbits + rbits
+        return None, None
+
+    def _call(self, node):
+        kind, bits = super()._call(node)
+        if node.func in ("min", "max") and kind == "float":
+            # either argument may be the result
+            kinds = {self.estimate(a)[0] for a in node.args}
+            if "fraction" in kinds:
+                return "fraction", bits
+        return kind, bits
+
+
+def is_integral(node):
+    """True if node only combines int literals with int-preserving operations.
+
+    ``**`` can still go negative at run time, so callers check the result type.
+    """
+    if isinstance(node, Num):
+        return type(node.value) is int
+    if isinstance(node, UnaryOp):
+        return is_integral(node.operand)
+    if isinstance(node, BinOp):
+        return node.op != "/" and is_integral(node.left) and is_integral(node.right)
+    if isinstance(node, Call):
+        return node.func in _INTEGRAL_FUNCTIONS and all(is_integral(a) for a in node.args)
+    return False
+
+
+def binary_range(node):
+    """(low, high) if node's value is exactly computable in floats, else None.
+
+    The value is then a multiple of 2**low below 2**high in magnitude: its
+    literals are binary fractions (0.5, 2.25, but not 0.1) and it only uses
+    ``+ - *`` and division by a power of two, with every intermediate within
+    a float's 53-bit significand and exponent range.
+    """
+    if isinstance(node, Num):
+        value = node.value
+        if type(value) is int:
+            n, d = value, 1
+        elif isinstance(value, float) and math.isfinite(value) and _to_fraction(value) == value:
+            n, d = value.as_integer_ratio()
+        else:
+            return None
+        if not n:
+            # zero: no bits at all
+            return math.inf, -math.inf
+        shift = d.bit_length() - 1
+        return (n & -n).bit_length() - 1 - shift, abs(n).bit_length() - shift
+    if isinstance(node, UnaryOp):
+        return binary_range(node.operand)
+    if not isinstance(node, BinOp) or node.op not in ("+", "-", "*", "/"):
+        return None
+    left, right = binary_range(node.left), binary_range(node.right)
+    if left is None or right is None:
+        return None
+    if node.op == "*":
+        low, high = left[0] + right[0], left[1] + right[1]
+    elif node.op == "/":
+        if right[1] - right[0] != 1:
+            return None
+        low, high = left[0] - right[0], left[1] - right[0]
+    else:
+        low, high = min(left[0], right[0]), max(left[1], right[1]) + 1
+    if high - low > _FLOAT_MANTISSA or low < -1074 or high > 1023:
+        return None
+    return low, high
+
+
+@lru_cache(maxsize=8)
+def decimal_context(precision: int):
+    return decimal.Context(prec=precision + GUARD_DIGITS,
+                           traps=[decimal.DivisionByZero, decimal.InvalidOperation, decimal.Overflow])
+
+
+@lru_cache(maxsize=256)
+def compile_precise(text: str, mode: str, budget: int = DEFAULT_BUDGET):
+    """Return (native, fn) for text compiled to Decimal or Fraction arithmetic.
+
+    native is "int" if only integers are combined, "float" if binary_range()
+    shows float arithmetic is exact, else None.
+    """
+    tree = parse(text)
+    if budget is not None:
+        (FractionCostEstimator if mode == "fraction" else CostEstimator)(budget).check(tree)
+    if mode == "decimal":
+        fn = compile_node(tree, DECIMAL_FUNCTIONS, DECIMAL_CONSTANTS, _to_decimal, DECIMAL_OPS)
+    elif mode == "fraction":
+        fn = compile_node(tree, FRACTION_FUNCTIONS, CONSTANTS, _to_fraction, FRACTION_OPS)
+    else:
+        raise ValueError(f"unknown precision mode {mode!r}")
+    if is_integral(tree):
+        return "int", fn
+    return ("float" if binary_range(tree) is not None else None), fn
+
+
+def evaluate_precise(text: str, mode: str, precision: int, native, budget: int = DEFAULT_BUDGET):
+    """Evaluate text in the given precision mode.
+
+    ``native`` evaluates text with the ordinary engine; it is used for
+    ``float`` mode and as the fast path whenever it yields an exact int.
+    """
+    if mode == "float":
+        return native(text)
+    fast, fn = compile_precise(text, mode, budget)
+    if fast is not None:
+        result = native(text)
+        if type(result) is int:
+            return result
+        # an integral expression can still give a float (2**-1): not exact then
+        if fast == "float":
+            if mode == "fraction" and result.is_integer():
+                return int(result)
+            return result
+    if mode == "fraction":
+        result = fn({})
+        if isinstance(result, Fraction) and result.denominator == 1:
+            return result.numerator
+        return result
+    try:
+        with decimal.localcontext(decimal_context(precision)):
+            result = fn({})
+            return +result if isinstance(result, Decimal) else result
+    except decimal.DivisionByZero:
+        raise ZeroDivisionError("division by zero") from None
+    except decimal.Overflow:
+        raise OverflowError("result too large") from None
+    except decimal.InvalidOperation:
+        raise ValueError("math domain error") from None
+
+
+def format_precise(result, precision: int):
+    """Format a Decimal/Fraction result to precision decimal places."""
+    if isinstance(result, Fraction):
+        with decimal.localcontext(decimal_context(precision)):
+            result = _int_to_decimal(result.numerator) / _int_to_decimal(result.denominator)
+    if isinstance(result, (Decimal, float)):
+        return f"{result:.{precision}f}"
+    return str(result)
@@ -1,6 +1,11 @@
 import tkinter as tk
 import re
-import math
+import queue
+
+from programmable_sandbox import ProgrammableSandbox, SandboxWorker
+
+# ms between checks for finished inputs while any are outstanding
+POLL_MS = 30
 
 
 class ProgrammableCalculator:
@@ -10,7 +15,15 @@ class ProgrammableCalculator:
         self.settings = settings or {}
         master.configure(bg="#f7f7f7")
 
-        self.user_env = {}
+        # inputs run on a worker thread so a long loop never blocks the UI;
+        # with the process backend the sandbox (and user_env) live in a
+        # memory/CPU-limited worker process that the thread talks to
+        if self.settings.get("programmable_backend", "process") == "process":
+            self.worker = SandboxWorker(factory=self._start_pool, settings=self.settings)
+        else:
+            self.worker = SandboxWorker(ProgrammableSandbox(self.settings))
+        self._outstanding = 0
+        self._polling = False
 
         # Configure grid to manage layout better
         master.grid_rowconfigure(0, weight=1)
@@ -48,11 +61,29 @@ class ProgrammableCalculator:
         self.clear_btn = tk.Button(btn_frame, text="Clear Output", command=self.clear_display, font=("Arial", 11), bg="#ff5e5e", fg="white", bd=0, padx=12, pady=6, relief="flat")
         self.clear_btn.pack(side="left")
 
+        self.cancel_btn = tk.Button(btn_frame, text="Cancel", command=self.cancel, font=("Arial", 11), bg="#f0ad4e", fg="white", bd=0, padx=12, pady=6, relief="flat", state="disabled")
+        self.cancel_btn.pack(side="left", padx=(8, 0))
+
+        self.status_label = tk.Label(btn_frame, text="", font=("Arial", 10, "italic"), bg="#f7f7f7", fg="#232b36")
+        self.status_label.pack(side="left", padx=(8, 0))
+
         # setup tags for basic syntax highlighting in the display
         self.display.tag_configure("kw", foreground="#ffb86b")
         self.display.tag_configure("num", foreground="#8be9fd")
         self.display.tag_configure("err", foreground="#ff6b6b")
 
+    def _start_pool(self):
+        from sandbox_pool import SandboxPool
+        return SandboxPool(self.settings)
+
+    @property
+    def user_env(self):
+        # None when the namespace lives in a worker process
+        return getattr(self.worker.sandbox, "user_env", None)
+
+    def close(self):
+        self.worker.close()
+
     def _on_enter(self, event=None):
         # Prevent inserting a newline and run evaluate
         try:
@@ -79,48 +110,53 @@ class ProgrammableCalculator:
         expr = self.input_entry.get("1.0", "end").strip()
         if not expr:
             return
+        # queue the input; results are shown in order as the worker finishes them
+        self.worker.submit(expr)
+        self._outstanding += 1
+        self.input_entry.delete("1.0", "end")
+        self._update_status()
+        if not self._polling:
+            self._polling = True
+            self.master.after(POLL_MS, self._poll)
+
+    def cancel(self):
+        """Stop the running input and drop the ones queued behind it."""
+        if self.worker.cancel():
+            self.status_label.configure(text="Cancelling...")
+
+    def _poll(self):
+        while True:
+            try:
+                outcome = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            self._outstanding -= 1
+            self._show(outcome)
+        self._update_status()
+        if self._outstanding > 0:
+            self.master.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _update_status(self):
+        if self._outstanding <= 0:
+            self.status_label.configure(text="")
+            self.cancel_btn.configure(state="disabled")
+            return
+        queued = self._outstanding - 1
+        self.status_label.configure(text=f"Running... ({queued} queued)" if queued else "Running...")
+        self.cancel_btn.configure(state="normal")
+
+    def _show(self, outcome):
+        expr = outcome.expression
         # show input
         insert_index = self.display.index(tk.END)
         self.display.insert(tk.END, f">>> {expr}\n")
-        try:
-            # restricted builtins
-            safe_builtins = {"abs": abs, "min": min, "max": max, "sum": sum, "round": round, "len": len}
-            safe_globals = {"__builtins__": safe_builtins, "math": math}
-            if expr.strip().startswith("def ") or "=" in expr:
-                exec(expr, safe_globals, self.user_env)
-                msg = "OK"
-                self.display.insert(tk.END, f"{msg}\n")
-                if self.history:
-                    self.history.add_entry(f"{expr} -> {msg}")
-            else:
-                result = eval(expr, safe_globals, self.user_env)
-                # format floats according to settings
-                if isinstance(result, float) and self.settings and "decimal_precision" in self.settings:
-                    prec = int(self.settings.get("decimal_precision", 4))
-                    result_str = f"{result:.{prec}f}"
-                else:
-                    result_str = str(result)
-                self.display.insert(tk.END, f"{result_str}\n")
-                if self.history:
-                    self.history.add_entry(f"{expr} = {result_str}")
-        except ZeroDivisionError:
-            msg = "Error: Division by zero"
-            self.display.insert(tk.END, f"{msg}\n")
+        self.display.insert(tk.END, f"{outcome.display}\n")
+        if outcome.error:
             self.display.tag_add("err", f"{insert_index}+1line", f"{insert_index}+1lineend")
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
-        except SyntaxError:
-            msg = "Error: Invalid expression"
-            self.display.insert(tk.END, f"{msg}\n")
-            self.display.tag_add("err", f"{insert_index}+1line", f"{insert_index}+1lineend")
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
-        except Exception as e:
-            msg = f"Error: {e}"
-            self.display.insert(tk.END, f"{msg}\n")
-            self.display.tag_add("err", f"{insert_index}+1line", f"{insert_index}+1lineend")
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
+        if self.history:
+            self.history.add_entry(outcome.record("programmable"))
 
         # basic highlight the input line we added
         try:
@@ -130,7 +166,6 @@ class ProgrammableCalculator:
             pass
 
         self.display.see(tk.END)
-        self.input_entry.delete("1.0", "end")
 
     def clear_display(self):
         self.display.delete(1.0, tk.END)
@@ -148,6 +183,7 @@ class ProgrammableCalculator:
             try:
                 self.eval_btn.configure(bg=theme.get("accent", "#2ecc71"), fg="white")
                 self.clear_btn.configure(bg="#ff5e5e", fg="white")
+                self.status_label.configure(bg=bg, fg=fg)
             except Exception:
                 pass
         except Exception:
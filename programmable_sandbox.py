@@ -0,0 +1,278 @@
+"""The restricted Python namespace behind the Programmable tab, without any UI."""
+import re
+import math
+import time
+import queue
+import ctypes
+import logging
+import functools
+import threading
+
+from evaluation import Evaluation
+from expression_cost import CostEstimator, DEFAULT_BUDGET
+from expression_engine import PYTHON_FUNCTIONS, PYTHON_CONSTANTS, parse
+from metrics import METRICS
+from vectorized import is_array, linspace, arange, evaluate_vectorized, format_array
+
+# inputs made only of names, numbers, arithmetic and calls can be parsed by the
+# engine (for the cost check and array evaluation); attribute access (other
+# than math.*) needs real Python
+_ARITHMETIC = re.compile(r"[\w\s.+\-*/%(),]*")
+_ATTRIBUTE = re.compile(r"\b(?!math\.)[A-Za-z_]\w*\s*\.")
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+# name = expression (but not ==, <=, ...)
+_ASSIGNMENT = re.compile(r"\s*([A-Za-z_]\w*)\s*=(?!=)(.*)", re.S)
+
+# restricted builtins
+SAFE_BUILTINS = {"abs": abs, "min": min, "max": max, "sum": sum, "round": round, "len": len}
+
+# largest cache a memo-decorated function may keep
+MEMO_MAX_SIZE = 4096
+
+
+def is_statement(source: str):
+    """Definitions and assignments are executed; anything else is evaluated."""
+    return source.strip().startswith(("def ", "@")) or "=" in source
+
+
+@functools.lru_cache(maxsize=256)
+def compile_source(source: str, mode: str):
+    """Compile Programmable input; code objects are cached per source text."""
+    # only cache misses get here
+    with METRICS.time("eval.compile"):
+        return compile(source, "<input>", mode)
+
+
+@functools.lru_cache(maxsize=256)
+def _arithmetic_names(expr: str, budget: int):
+    """Names in plain arithmetic input, once it has passed the cost budget; None for other input."""
+    if not _ARITHMETIC.fullmatch(expr) or _ATTRIBUTE.search(expr):
+        return None
+    try:
+        tree = parse(expr)
+    except SyntaxError:
+        return None
+    CostEstimator(budget, PYTHON_FUNCTIONS, PYTHON_CONSTANTS).check(tree)
+    return frozenset(_IDENTIFIER.findall(expr))
+
+
+def error_message(exc):
+    if isinstance(exc, ZeroDivisionError):
+        return "Error: Division by zero"
+    if isinstance(exc, SyntaxError):
+        return "Error: Invalid expression"
+    if isinstance(exc, MemoryError):
+        return "Error: Out of memory"
+    return f"Error: {exc}"
+
+
+class ProgrammableSandbox:
+    """Runs Programmable-tab input against a persistent user namespace.
+
+    ``user_env`` starts out as safe_globals() and is used as the globals of
+    every input, so user functions can call each other and themselves.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+        # memo-decorated functions by name, for cache_stats()
+        self.memoized = {}
+        self.user_env = self.safe_globals()
+
+    def safe_globals(self):
+        builtins = dict(SAFE_BUILTINS, memo=self.memo, cache_stats=self.cache_stats)
+        return {"__builtins__": builtins, "math": math, "linspace": linspace, "arange": arange}
+
+    def memo(self, fn=None, maxsize: int = 128):
+        """LRU-cache decorator for user functions: ``@memo`` or ``@memo(maxsize=1000)``."""
+        if fn is None:
+            return functools.partial(self.memo, maxsize=maxsize)
+        if maxsize is None or maxsize > MEMO_MAX_SIZE:
+            maxsize = MEMO_MAX_SIZE
+        cached = functools.lru_cache(maxsize=maxsize)(fn)
+        self.memoized[getattr(fn, "__name__", repr(fn))] = cached
+        return cached
+
+    def cache_stats(self):
+        """Hits, misses and sizes of the code cache and of every memo function."""
+        def info(cached):
+            i = cached.cache_info()
+            total = i.hits + i.misses
+            return {"hits": i.hits, "misses": i.misses, "hit_rate": round(i.hits / total, 3) if total else 0.0,
+                    "size": i.currsize, "max_size": i.maxsize}
+
+        stats = {"code": info(compile_source)}
+        stats.update((f"memo.{name}", info(cached)) for name, cached in self.memoized.items())
+        return stats
+
+    @METRICS.timed("eval.programmable")
+    def run(self, source: str):
+        """Execute or evaluate source; never raises."""
+        start = time.perf_counter()
+        try:
+            if is_statement(source):
+                if not self._assign_vectorized(source):
+                    exec(compile_source(source, "exec"), self.user_env)
+                return Evaluation(source, None, "OK", duration=time.perf_counter() - start)
+            result = self._eval_expression(source)
+            # format floats according to settings
+            prec = None
+            if is_array(result):
+                display = result = format_array(result, self.settings.get("decimal_precision"))
+            elif isinstance(result, float) and "decimal_precision" in self.settings:
+                prec = int(self.settings.get("decimal_precision", 4))
+                display = f"{result:.{prec}f}"
+            else:
+                display = str(result)
+            return Evaluation(source, result, display, precision=prec, duration=time.perf_counter() - start)
+        except Exception as e:
+            return Evaluation(source, None, error_message(e), error=True, duration=time.perf_counter() - start)
+
+    def _uses_arrays(self, expr):
+        return any(is_array(self.user_env.get(name)) for name in _IDENTIFIER.findall(expr))
+
+    def _engine_env(self):
+        # the vectorized evaluator needs a real dict; its array work dwarfs the copy
+        env = dict(self.user_env["__builtins__"])
+        env.update(self.user_env)
+        return env
+
+    def _assign_vectorized(self, expr):
+        # y = f(x) over an array x runs as one vectorized evaluation
+        m = _ASSIGNMENT.fullmatch(expr)
+        if not m:
+            return False
+        rhs = m.group(2).strip()
+        if not (_ARITHMETIC.fullmatch(rhs) and not _ATTRIBUTE.search(rhs) and self._uses_arrays(rhs)):
+            return False
+        self.user_env[m.group(1)] = evaluate_vectorized(rhs, self._engine_env())
+        return True
+
+    def _eval_expression(self, expr):
+        # arithmetic is checked against the cost budget once per source text;
+        # CPython then runs the cached code faster than the engine's closures would
+        names = _arithmetic_names(expr, int(self.settings.get("eval_cost_budget", DEFAULT_BUDGET)))
+        if names and any(is_array(self.user_env.get(name)) for name in names):
+            return evaluate_vectorized(expr, self._engine_env())
+        return eval(compile_source(expr, "eval"), self.user_env)
+
+
+class EvaluationCancelled(BaseException):
+    """Raised inside the worker thread to stop the input it is running.
+
+    A BaseException, like KeyboardInterrupt, so that ``except Exception``
+    in user code (or in ProgrammableSandbox.run) does not swallow it.
+    """
+
+
+def _async_raise(thread_id, exc_type):
+    # exc_type None clears an exception that was set but not yet raised
+    set_async_exc = getattr(getattr(ctypes, "pythonapi", None), "PyThreadState_SetAsyncExc", None)
+    if set_async_exc is None:
+        return False
+    return set_async_exc(ctypes.c_ulong(thread_id), ctypes.py_object(exc_type) if exc_type else None) == 1
+
+
+class SandboxWorker:
+    """Runs sandbox inputs one at a time on a background thread.
+
+    submit() queues an input; the Evaluation for each one is put on
+    ``results`` in submission order, for the UI thread to poll. cancel()
+    interrupts the running input at its next bytecode. A single long C call
+    (say ``10**10**8``) cannot be interrupted and finishes first, unless the
+    sandbox is a SandboxPool, which kills its worker process instead.
+
+    With factory, the sandbox is created on the worker thread (a process
+    pool takes a while to start); if that fails, an in-process sandbox is
+    used.
+    """
+
+    def __init__(self, sandbox=None, factory=None, settings=None):
+        self.log = logging.getLogger(__name__)
+        self.sandbox = sandbox
+        self._factory = factory
+        self._settings = settings
+        self.inbox = queue.Queue()
+        self.results = queue.Queue()
+        # source of the input being run, None while idle
+        self.running = None
+        self._cancel_sent = False
+        self._drop_pending = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="programmable-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, source: str):
+        self.inbox.put(source)
+
+    def pending(self):
+        return self.inbox.qsize()
+
+    def cancel(self, drop_pending: bool = True):
+        """Stop the running input (and, by default, everything queued behind it)."""
+        with self._lock:
+            if self.running is None or self._cancel_sent:
+                return False
+            self._cancel_sent = _async_raise(self._thread.ident, EvaluationCancelled)
+            self._drop_pending = drop_pending and self._cancel_sent
+            return self._cancel_sent
+
+    def close(self):
+        self.cancel()
+        self.inbox.put(None)
+        self._thread.join(1.0)
+        close = getattr(self.sandbox, "close", None)
+        if close is not None:
+            close()
+
+    def _run(self):
+        if self.sandbox is None:
+            try:
+                self.sandbox = self._factory()
+            except Exception:
+                self.log.exception("Could not start the sandbox pool; running inputs in-process")
+                self.sandbox = ProgrammableSandbox(self._settings)
+        while True:
+            try:
+                self._serve()
+                return
+            except EvaluationCancelled:
+                # the cancel landed just after the input finished
+                self._finish(Evaluation(self.running, None, "Error: Cancelled", error=True))
+
+    def _serve(self):
+        while True:
+            source = self.inbox.get()
+            if source is None:
+                return
+            with self._lock:
+                self.running = source
+                self._cancel_sent = False
+                self._drop_pending = False
+            try:
+                outcome = self.sandbox.run(source)
+            except EvaluationCancelled:
+                outcome = Evaluation(source, None, "Error: Cancelled", error=True)
+            except Exception as e:
+                # sandbox.run should never raise; if it does, keep serving
+                self.log.exception("Programmable input failed: %s", source)
+                outcome = Evaluation(source, None, error_message(e), error=True)
+            self._finish(outcome)
+
+    def _finish(self, outcome):
+        with self._lock:
+            if self._cancel_sent:
+                # a cancel sent too late to interrupt anything must not fire later
+                _async_raise(self._thread.ident, None)
+            self.running = None
+            drop, self._drop_pending = self._drop_pending, False
+        self.results.put(outcome)
+        while drop:
+            try:
+                source = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if source is None:
+                self.inbox.put(None)
+                break
+            self.results.put(Evaluation(source, None, "Error: Cancelled", error=True))
@@ -0,0 +1,256 @@
+"""Programmable-tab inputs run in warm worker processes with CPU and memory limits.
+
+SandboxPool has the same ``run(source) -> Evaluation`` interface as
+ProgrammableSandbox, but the sandbox and its ``user_env`` live in a worker
+process:
+
+- The worker's address space is capped with RLIMIT_AS, so ``[0]*10**10``
+  fails with MemoryError instead of exhausting the machine.
+- Each input gets an RLIMIT_CPU allowance and a wall-clock timeout.
+
+When a worker is killed (timeout, CPU limit, crash or Cancel), an
+already-started spare takes over. The statements that succeeded so far
+are replayed into it, so user definitions survive. Workers are forked
+from a forkserver that has the sandbox preloaded, never from the Tk
+process itself. The ``resource`` limits apply where the module exists
+(not on Windows); timeouts and restarts work everywhere.
+"""
+import re
+import sys
+import time
+import signal
+import logging
+import multiprocessing
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from evaluation import Evaluation
+from programmable_sandbox import ProgrammableSandbox, EvaluationCancelled, is_statement
+
+DEFAULT_MEMORY_MB = 1024
+DEFAULT_CPU_SECONDS = 10
+DEFAULT_TIMEOUT = 15.0
+# how often a waiting run() wakes up, so that a Cancel can reach it
+_WAIT_SLICE = 0.05
+_PORTABLE = (int, float, complex, str, bool, type(None))
+# statements kept for replay; beyond this the oldest are forgotten
+MAX_DEFINITIONS = 500
+_NAME = re.compile(r"[A-Za-z_]\w*")
+# "def name" (after any decorators) or "name = value"
+_DEFINITION = re.compile(r"\s*(?:@[^\n]*\n\s*)*(?:def\s+([A-Za-z_]\w*)|([A-Za-z_]\w*)\s*=(?!=)(.*))", re.S)
+
+
+def _context():
+    if sys.platform != "win32" and "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["programmable_sandbox"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _limit_memory(memory_mb):
+    if resource is None or not memory_mb:
+        return
+    limit = int(memory_mb) * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu(cpu_seconds):
+    # RLIMIT_CPU counts the whole life of the process, so move the soft limit
+    # to "used so far + allowance"; going over it kills the worker (SIGXCPU)
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _replaces(source):
+    """The name source (re)defines without reading its old value, or None."""
+    m = _DEFINITION.match(source)
+    if m is None:
+        return None
+    if m.group(1):
+        return m.group(1)
+    name = m.group(2)
+    return None if name in _NAME.findall(m.group(3)) else name
+
+
+def _portable(outcome):
+    # results such as functions cannot cross the pipe; their text can
+    if not isinstance(outcome.result, _PORTABLE):
+        outcome.result = outcome.display
+    return outcome
+
+
+def _worker_main(conn, memory_mb, cpu_seconds):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _limit_memory(memory_mb)
+    sandbox = ProgrammableSandbox()
+    while True:
+        try:
+            op, payload, settings = conn.recv()
+        except (EOFError, OSError):
+            return
+        sandbox.settings = settings
+        if op == "run":
+            _limit_cpu(cpu_seconds)
+            conn.send(_portable(sandbox.run(payload)))
+        elif op == "replay":
+            _limit_cpu(cpu_seconds)
+            failed = [source for source in payload if sandbox.run(source).error]
+            conn.send(failed)
+        else:
+            return
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb, cpu_seconds):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, memory_mb, cpu_seconds),
+                                   name="sandbox-worker", daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(1.0)
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class WorkerTimeout(Exception):
+    pass
+
+
+class SandboxPool:
+    def __init__(self, settings=None, spares: int = 1, memory_mb=None, cpu_seconds=None, timeout=None):
+        self.log = logging.getLogger(__name__)
+        self.settings = settings if settings is not None else {}
+        self.memory_mb = memory_mb if memory_mb is not None else \
+            int(self.settings.get("sandbox_memory_mb", DEFAULT_MEMORY_MB))
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else \
+            int(self.settings.get("sandbox_cpu_seconds", DEFAULT_CPU_SECONDS))
+        self.timeout = timeout if timeout is not None else \
+            float(self.settings.get("sandbox_timeout", DEFAULT_TIMEOUT))
+        self.spares = spares
+        self.restarts = 0
+        # statements that ran successfully, replayed into a replacement worker
+        self.definitions = []
+        # set while a restart has not restored the definitions yet
+        self._stale = False
+        self._ctx = _context()
+        self._spare_workers = deque()
+        self._active = self._spawn()
+        self._fill_spares()
+
+    def run(self, source: str):
+        """Run source in the active worker; never raises except EvaluationCancelled."""
+        start = time.perf_counter()
+        try:
+            if self._stale:
+                # an earlier restart was cancelled part-way
+                self._restart("interrupted")
+            outcome = self._request(("run", source), self.timeout)
+        except EvaluationCancelled:
+            self._restart("cancelled")
+            raise
+        except WorkerTimeout:
+            self._restart("timed out")
+            return Evaluation(source, None, f"Error: Timed out after {self.timeout:g}s", error=True,
+                              duration=time.perf_counter() - start)
+        except (EOFError, OSError):
+            self._restart("stopped")
+            return Evaluation(source, None, "Error: Stopped (CPU time or memory limit exceeded)", error=True,
+                              duration=time.perf_counter() - start)
+        if not outcome.error and is_statement(source):
+            self._remember(source)
+        return outcome
+
+    def close(self):
+        for worker in [self._active, *self._spare_workers]:
+            if worker is not None:
+                worker.kill()
+        self._active = None
+        self._spare_workers.clear()
+
+    def _request(self, message, timeout):
+        worker = self._active
+        worker.conn.send((message[0], message[1], dict(self.settings)))
+        deadline = time.monotonic() + timeout
+        # wait in short slices: a cancel raised in this thread lands between them
+        while not worker.conn.poll(_WAIT_SLICE):
+            if not worker.process.is_alive() and not worker.conn.poll(0):
+                raise EOFError("worker exited")
+            if time.monotonic() >= deadline:
+                raise WorkerTimeout()
+        return worker.conn.recv()
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.memory_mb, self.cpu_seconds)
+
+    def _fill_spares(self):
+        while len(self._spare_workers) < self.spares:
+            self._spare_workers.append(self._spawn())
+
+    def _remember(self, source: str):
+        name = _replaces(source)
+        if name is not None:
+            # drop the previous definition of name, unless a statement since then used it
+            for i in range(len(self.definitions) - 1, -1, -1):
+                if name in _NAME.findall(self.definitions[i]):
+                    if _replaces(self.definitions[i]) == name:
+                        del self.definitions[i]
+                    break
+        self.definitions.append(source)
+        if len(self.definitions) > MAX_DEFINITIONS:
+            del self.definitions[0]
+
+    def _restart(self, reason: str):
+        """Replace the active worker with a warm spare and restore the definitions."""
+        self.restarts += 1
+        self._stale = True
+        self._active.kill()
+        while self._spare_workers:
+            worker = self._spare_workers.popleft()
+            if worker.process.is_alive():
+                break
+            worker.kill()
+        else:
+            worker = self._spawn()
+        self._active = worker
+        self.log.info("Sandbox worker %s; restoring %d definitions", reason, len(self.definitions))
+        if self.definitions:
+            try:
+                failed = self._request(("replay", self.definitions), self.timeout)
+            except EvaluationCancelled:
+                # the replay's reply would be left in the pipe for the next run():
+                # drop this worker; the next run() restarts (and replays) again
+                self._active.kill()
+                raise
+            except (WorkerTimeout, EOFError, OSError):
+                # the definitions themselves no longer fit the limits: start clean
+                self.log.warning("Could not restore sandbox definitions")
+                self._active.kill()
+                self._active = self._spawn()
+                self.definitions = []
+            else:
+                if failed:
+                    self.definitions = [d for d in self.definitions if d not in failed]
+        self._fill_spares()
+        self._stale = False
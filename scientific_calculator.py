@@ -1,12 +1,14 @@
 import tkinter as tk
-import math
 from tkinter import simpledialog
 
+from evaluation import evaluate_function, evaluate_scientific
+
 class ScientificCalculator:
-    def __init__(self, master, history=None, settings=None):
+    def __init__(self, master, history=None, settings=None, cache=None):
         self.master = master
         self.history = history
         self.settings = settings or {}
+        self.cache = cache
         master.configure(bg="#f7f7f7")
         
         # Configure grid for responsiveness
@@ -64,94 +66,27 @@ class ScientificCalculator:
         val = self.entry.get().strip()
         if not val:
             return
-        try:
-            # allow expressions with ^ for power
-            expr = val.replace('^', '**')
-            base = float(eval(expr))
-        except Exception as e:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, f"Error: invalid input")
-            return
-
-        try:
-            if name == "sin":
-                # treat input as degrees
-                res = math.sin(math.radians(base))
-            elif name == "cos":
-                res = math.cos(math.radians(base))
-            elif name == "tan":
-                res = math.tan(math.radians(base))
-            elif name == "sqrt":
-                if base < 0:
-                    raise ValueError("negative")
-                res = math.sqrt(base)
-            elif name == "ln":
-                if base <= 0:
-                    raise ValueError("non-positive")
-                res = math.log(base)
-            elif name == "log":
-                if base <= 0:
-                    raise ValueError("non-positive")
-                res = math.log10(base)
-            elif name == "!":
-                n = int(base)
-                if n < 0:
-                    raise ValueError("negative")
-                res = math.factorial(n)
-            elif name == "x^y":
-                # expect input like "base,exponent"
-                if "," in val:
-                    parts = val.split(",")
-                    base = float(parts[0])
-                    exp = float(parts[1])
-                    res = base ** exp
-                else:
-                    # ask for exponent
-                    exp = simpledialog.askfloat("Exponent", "Enter exponent:", parent=self.master)
-                    if exp is None:
-                        return
-                    res = base ** exp
-            else:
+        exponent = None
+        if name == "x^y" and "," not in val:
+            # ask for exponent; "base,exponent" input needs no dialog
+            exponent = simpledialog.askfloat("Exponent", "Enter exponent:", parent=self.master)
+            if exponent is None:
                 return
-
-            prec = int(self.settings.get("decimal_precision", 4)) if self.settings else 4
-            if isinstance(res, float):
-                out = f"{res:.{prec}f}"
-            else:
-                out = str(res)
-            # show result
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, out)
-            # log to history
-            if self.history:
-                self.history.add_entry(f"{name}({val}) = {out}")
-        except ValueError:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, "Error: invalid input")
-        except Exception as e:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, f"Error: {e}")
+        outcome = evaluate_function(name, val, self.settings, self.cache, exponent)
+        # show result
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, outcome.display)
+        # log to history
+        if self.history and not outcome.error:
+            self.history.add_entry(outcome.record("scientific"))
 
     def evaluate(self):
         expr = self.entry.get().strip()
         if not expr:
             return
-        try:
-            expr_eval = expr.replace('^', '**')
-            result = eval(expr_eval)
-            prec = int(self.settings.get("decimal_precision", 4)) if self.settings else 4
-            if isinstance(result, float):
-                out = f"{result:.{prec}f}"
-            else:
-                out = str(result)
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, out)
-            if self.history:
-                self.history.add_entry(f"{expr} = {out}")
-        except ZeroDivisionError:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, "Error: Divide by zero")
-        except Exception as e:
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, "Error: invalid expression")
-            return
+        outcome = evaluate_scientific(expr, self.settings, self.cache)
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, outcome.display)
+        # errors are shown but not recorded
+        if self.history and not outcome.error:
+            self.history.add_entry(outcome.record("scientific"))
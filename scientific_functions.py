@@ -0,0 +1,54 @@
+"""Scientific-tab functions, as the buttons and the expression engine see them.
+
+Trig works in degrees, like the buttons.
+"""
+import math
+
+
+def _sin(x):
+    return math.sin(math.radians(x))
+
+
+def _cos(x):
+    return math.cos(math.radians(x))
+
+
+def _tan(x):
+    return math.tan(math.radians(x))
+
+
+def _sqrt(x):
+    if x < 0:
+        raise ValueError("negative")
+    return math.sqrt(x)
+
+
+def _ln(x):
+    if x <= 0:
+        raise ValueError("non-positive")
+    return math.log(x)
+
+
+def _log(x):
+    if x <= 0:
+        raise ValueError("non-positive")
+    return math.log10(x)
+
+
+def _fact(x):
+    if isinstance(x, float):
+        if not x.is_integer():
+            raise ValueError("non-integer")
+        x = int(x)
+    if x < 0:
+        raise ValueError("negative")
+    return math.factorial(x)
+
+
+SCIENTIFIC_FUNCTIONS = {
+    "sin": _sin, "cos": _cos, "tan": _tan,
+    "sqrt": _sqrt, "ln": _ln, "log": _log,
+    "fact": _fact,
+}
+# button label -> function name
+BUTTONS = {"sin": "sin", "cos": "cos", "tan": "tan", "sqrt": "sqrt", "ln": "ln", "log": "log", "!": "fact"}
@@ -1,10 +1,13 @@
 import tkinter as tk
 
+from evaluation import evaluate_standard
+
 class StandardCalculator:
-    def __init__(self, master, history=None, settings=None):
+    def __init__(self, master, history=None, settings=None, cache=None):
         self.master = master
         self.history = history
         self.settings = settings or {}
+        self.cache = cache
         master.configure(bg="#f7f7f7")
 
         # Flag to track if the last operation was an evaluation
@@ -45,40 +48,12 @@ class StandardCalculator:
         expr = self.entry.get()
         if not expr.strip():
             return
-        try:
-            result = eval(expr)
-            # format floats according to settings
-            if isinstance(result, float) and self.settings and "decimal_precision" in self.settings:
-                prec = int(self.settings.get("decimal_precision", 4))
-                result_str = f"{result:.{prec}f}"
-            else:
-                result_str = str(result)
-            self.entry.delete(0, tk.END)
-            self.entry.insert(tk.END, result_str)
-            self.last_was_equal = True
-            if self.history:
-                self.history.add_entry(f"{expr} = {result_str}")
-        except ZeroDivisionError:
-            msg = "Error: Divide by zero"
-            self.entry.delete(0, tk.END)
-            self.entry.insert(tk.END, msg)
-            self.last_was_equal = True
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
-        except (SyntaxError, NameError):
-            msg = "Error: Invalid expression"
-            self.entry.delete(0, tk.END)
-            self.entry.insert(tk.END, msg)
-            self.last_was_equal = True
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
-        except Exception as e:
-            msg = f"Error: {e}"
-            self.entry.delete(0, tk.END)
-            self.entry.insert(tk.END, msg)
-            self.last_was_equal = True
-            if self.history:
-                self.history.add_entry(f"{expr} -> {msg}")
+        outcome = evaluate_standard(expr, self.settings, self.cache)
+        self.entry.delete(0, tk.END)
+        self.entry.insert(tk.END, outcome.display)
+        self.last_was_equal = True
+        if self.history:
+            self.history.add_entry(outcome.record("standard"))
 
     def on_click(self, event):
         text = event.widget["text"]
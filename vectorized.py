@@ -0,0 +1,203 @@
+"""Evaluate an expression over arrays of variable bindings.
+
+The expression is parsed and optimized once by the engine, then compiled
+against NumPy: operators broadcast over whole arrays and ``math.*`` calls
+map to the equivalent ufuncs. Functions with no NumPy equivalent, and user
+functions that reject arrays, are applied element by element. NumPy is
+optional; without it arrays are ``array("d")`` and every expression takes
+that scalar path.
+"""
+import math
+from array import array
+from functools import lru_cache, reduce
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from expression_engine import Name, UnaryOp, BinOp, Call, PYTHON_FUNCTIONS, PYTHON_CONSTANTS
+from expression_optimizer import OptimizedExpression, compile_optimized
+
+# math.* name -> numpy name, where the semantics match
+_NUMPY_NAMES = {
+    "sin": "sin", "cos": "cos", "tan": "tan", "asin": "arcsin", "acos": "arccos", "atan": "arctan",
+    "atan2": "arctan2", "sinh": "sinh", "cosh": "cosh", "tanh": "tanh", "asinh": "arcsinh",
+    "acosh": "arccosh", "atanh": "arctanh", "exp": "exp", "expm1": "expm1", "log10": "log10",
+    "log2": "log2", "log1p": "log1p", "sqrt": "sqrt", "fabs": "fabs", "floor": "floor", "ceil": "ceil",
+    "trunc": "trunc", "hypot": "hypot", "degrees": "degrees", "radians": "radians",
+    "copysign": "copysign", "fmod": "fmod", "pow": "power", "isnan": "isnan", "isinf": "isinf",
+    "isfinite": "isfinite",
+}
+# builtins available in the Programmable tab, as array operations
+_NUMPY_BUILTINS = {"abs": "abs", "round": "round", "sum": "sum"}
+
+# arrays longer than this are shown abbreviated
+SUMMARY_ITEMS = 3
+
+
+def is_array(value):
+    if np is not None and isinstance(value, np.ndarray):
+        return value.ndim > 0
+    return isinstance(value, array)
+
+
+def linspace(start, stop, num=50):
+    """num evenly spaced values from start to stop inclusive (num may be 1e6)."""
+    num = int(num)
+    if np is not None:
+        return np.linspace(start, stop, num)
+    if num == 1:
+        return array("d", [start])
+    step = (stop - start) / (num - 1)
+    return array("d", (start + i * step for i in range(num)))
+
+
+def arange(start, stop=None, step=1):
+    if stop is None:
+        start, stop = 0, start
+    if np is not None:
+        return np.arange(start, stop, step)
+    count = max(0, math.ceil((stop - start) / step))
+    return array("d", (start + i * step for i in range(count)))
+
+
+def _elementwise(fn):
+    """Call fn on whole arrays if it accepts them, else once per element."""
+    def call(*args):
+        if not any(isinstance(a, np.ndarray) for a in args):
+            return fn(*args)
+        try:
+            return fn(*args)
+        except (TypeError, ValueError):
+            pass
+        # a declared otype skips vectorize's probe call, which would decide
+        # the dtype from the first element alone (int truncates later floats)
+        try:
+            return np.vectorize(fn, otypes=[float])(*args)
+        except (TypeError, ValueError):
+            return np.vectorize(fn, otypes=[object])(*args)
+    return call
+
+
+def _log(x, base=None):
+    return np.log(x) if base is None else np.log(x) / np.log(base)
+
+
+def _minimum(*args):
+    return reduce(np.minimum, args) if len(args) > 1 else np.min(args[0])
+
+
+def _maximum(*args):
+    return reduce(np.maximum, args) if len(args) > 1 else np.max(args[0])
+
+
+def _numpy_functions():
+    functions = {name: _elementwise(fn) for name, fn in PYTHON_FUNCTIONS.items()}
+    for name, np_name in _NUMPY_NAMES.items():
+        functions[f"math.{name}"] = getattr(np, np_name)
+    for name, np_name in _NUMPY_BUILTINS.items():
+        functions[name] = getattr(np, np_name)
+    functions["math.log"] = _log
+    functions["min"] = _minimum
+    functions["max"] = _maximum
+    return functions
+
+
+NUMPY_FUNCTIONS = _numpy_functions() if np is not None else None
+
+
+def _names(node, out):
+    """Collect variable and user-function names used by node."""
+    if isinstance(node, Name):
+        out.add(node.id)
+    elif isinstance(node, UnaryOp):
+        _names(node.operand, out)
+    elif isinstance(node, BinOp):
+        _names(node.left, out)
+        _names(node.right, out)
+    elif isinstance(node, Call):
+        out.add(node.func)
+        for arg in node.args:
+            _names(arg, out)
+    return out
+
+
+class VectorizedExpression:
+    """An expression compiled once for evaluation over arrays of bindings."""
+
+    def __init__(self, text: str):
+        self.scalar = compile_optimized(text, "python")
+        self.names = _names(self.scalar.tree, set())
+        for _, sub in self.scalar.temps:
+            _names(sub, self.names)
+        self._vector = None
+        if np is not None:
+            s = self.scalar
+            self._vector = OptimizedExpression(s.source, s.key, s.tree, s.temps, s.rewrites,
+                                               NUMPY_FUNCTIONS, PYTHON_CONSTANTS)
+
+    def __call__(self, env):
+        if self._vector is not None:
+            return self._evaluate_numpy(env)
+        return self._evaluate_scalar(env)
+
+    def _evaluate_numpy(self, env):
+        scope = dict(env)
+        for name in self.names:
+            value = scope.get(name)
+            if isinstance(value, array):
+                scope[name] = np.frombuffer(value, dtype=float)
+            elif callable(value) and not isinstance(value, type):
+                # user functions get arrays when they can take them
+                scope[name] = _elementwise(value)
+        return self._vector(scope)
+
+    def _evaluate_scalar(self, env):
+        arrays = {name: env[name] for name in self.names if is_array(env.get(name))}
+        if not arrays:
+            return self.scalar(env)
+        lengths = {len(v) for v in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError("arrays have different lengths")
+        scope = dict(env)
+        out = []
+        try:
+            for i in range(lengths.pop()):
+                for name, values in arrays.items():
+                    scope[name] = values[i]
+                out.append(self.scalar(scope))
+        except TypeError:
+            if out:
+                raise
+            # a reduction such as sum(x) or max(x) wants the whole array
+            return self.scalar(env)
+        try:
+            return array("d", out)
+        except TypeError:
+            return out
+
+
+@lru_cache(maxsize=128)
+def compile_vectorized(text: str):
+    return VectorizedExpression(text)
+
+
+def evaluate_vectorized(text: str, env):
+    """Evaluate text once over all array-valued bindings in env."""
+    return compile_vectorized(text)(env)
+
+
+def format_array(value, precision=None):
+    """Short display form of an array result: first and last items and the length."""
+    def fmt(values):
+        if np is not None and isinstance(values, np.ndarray):
+            values = values.tolist()
+        return ", ".join(f"{v:.{precision}f}" if isinstance(v, float) and precision is not None else str(v)
+                         for v in values)
+
+    if len(value) <= 2 * SUMMARY_ITEMS:
+        body = fmt(value)
+    else:
+        body = f"{fmt(value[:SUMMARY_ITEMS])}, ..., {fmt(value[-SUMMARY_ITEMS:])}"
+    return f"[{body}] ({len(value)} values)"